@@ -0,0 +1,131 @@
+import numpy as np
+
+
+class RunningStats:
+	"""
+	Running mean and variance of a series of arrays (for example the
+	lock-in magnitudes of each window) using Welford's algorithm. Only
+	the count, mean and sum of squared deviations are stored. Two 
+	accumulators from separate processes or runs can be merged exactly.
+	"""
+	def __init__(self):
+		self.count = 0
+		self.mean = None
+		self.m2 = None
+
+	def update(self, values):
+		"""
+		Adds one array of values.
+		"""
+		values = np.asarray(values, dtype = float)
+		self.count += 1
+		if self.mean is None:
+			self.mean = values.copy()
+			self.m2 = np.zeros(values.shape)
+			return self
+		delta = values - self.mean
+		self.mean += delta/self.count
+		self.m2 += delta * (values - self.mean)
+		return self
+
+	def update_many(self, values):
+		"""
+		Adds every array along the first axis of values.
+		"""
+		values = np.asarray(values, dtype = float)
+		batch = RunningStats()
+		batch.count = len(values)
+		batch.mean = np.mean(values, axis = 0)
+		batch.m2 = np.sum((values - batch.mean)**2, axis = 0)
+		return self.merge(batch)
+
+	def merge(self, other):
+		"""
+		Adds all the values accumulated by another RunningStats.
+		"""
+		if other.count == 0:
+			return self
+		if self.count == 0:
+			self.count, self.mean, self.m2 = other.count, other.mean.copy(), other.m2.copy()
+			return self
+		count = self.count + other.count
+		delta = other.mean - self.mean
+		self.mean = self.mean + delta * other.count/count
+		self.m2 = self.m2 + other.m2 + delta**2 * self.count * other.count/count
+		self.count = count
+		return self
+
+	def variance(self, ddof = 1):
+		"""
+		Returns the variance, by default the unbiased sample variance.
+		"""
+		if self.count - ddof <= 0:
+			return np.full(np.shape(self.mean), np.nan)
+		return self.m2/(self.count - ddof)
+
+	def std(self, ddof = 1):
+		"""
+		Returns the standard deviation, see variance.
+		"""
+		return np.sqrt(self.variance(ddof))
+
+
+class CircularStats:
+	"""
+	Running circular mean and standard deviation of a series of arrays 
+	of angles (for example the lock-in phases of each window). Angles 
+	are accumulated as unit vectors, so phases on either side of +/- pi
+	average correctly. Two accumulators can be merged exactly.
+	"""
+	def __init__(self):
+		self.count = 0
+		self.sum_cos = 0
+		self.sum_sin = 0
+
+	def update(self, angles):
+		"""
+		Adds one array of angles (radians).
+		"""
+		angles = np.asarray(angles, dtype = float)
+		self.count += 1
+		self.sum_cos = self.sum_cos + np.cos(angles)
+		self.sum_sin = self.sum_sin + np.sin(angles)
+		return self
+
+	def update_many(self, angles):
+		"""
+		Adds every array of angles along the first axis of angles.
+		"""
+		angles = np.asarray(angles, dtype = float)
+		self.count += len(angles)
+		self.sum_cos = self.sum_cos + np.sum(np.cos(angles), axis = 0)
+		self.sum_sin = self.sum_sin + np.sum(np.sin(angles), axis = 0)
+		return self
+
+	def merge(self, other):
+		"""
+		Adds all the angles accumulated by another CircularStats.
+		"""
+		self.count += other.count
+		self.sum_cos = self.sum_cos + other.sum_cos
+		self.sum_sin = self.sum_sin + other.sum_sin
+		return self
+
+	@property
+	def mean(self):
+		"""
+		Circular mean in radians, between -pi and pi.
+		"""
+		return np.arctan2(self.sum_sin, self.sum_cos)
+
+	def std(self, ddof = 1):
+		"""
+		Circular standard deviation, sqrt(-2 ln R) where R is the mean
+		resultant length. For tightly grouped angles this approaches the
+		linear standard deviation, including the ddof correction.
+		"""
+		if self.count - ddof <= 0:
+			return np.full(np.shape(self.sum_cos), np.nan)
+		resultant = np.hypot(self.sum_cos, self.sum_sin)/self.count
+		resultant = np.clip(resultant, np.finfo(float).tiny, 1)
+		return np.sqrt(-2 * np.log(resultant) * self.count/(self.count - ddof))
@@ -0,0 +1,13 @@
+"""
+Benchmarks of the lock-in amplifier. Run them from the command line with
+
+	python -m SILIA.benchmarks run --suite quick --output results.json
+
+and check results against a baseline from an earlier run with
+
+	python -m SILIA.benchmarks compare results.json baseline.json --threshold 0.1
+
+which exits with an error if any scenario got slower or uses more memory.
+"""
+from .scenarios import scenario, suite, make_inputs
+from .runner import measure, run, compare
@@ -0,0 +1,47 @@
+import argparse
+import json
+import sys
+from .scenarios import suite
+from .runner import run, compare
+
+
+def main(args = None):
+	parser = argparse.ArgumentParser(prog = 'python -m SILIA.benchmarks',
+	 description = 'Benchmarks of the SILIA lock-in amplifier.')
+	commands = parser.add_subparsers(dest = 'command', required = True)
+
+	run_parser = commands.add_parser('run', help = 'run a benchmark suite')
+	run_parser.add_argument('--suite', default = 'quick', choices = ['quick', 'full'])
+	run_parser.add_argument('--repeats', type = int, default = 7)
+	run_parser.add_argument('--only', default = None,
+	 help = 'only run scenarios whose name contains this string')
+	run_parser.add_argument('--output', default = 'benchmark_results.json')
+	run_parser.add_argument('--baseline', default = None,
+	 help = 'compare the results against this baseline')
+	run_parser.add_argument('--threshold', type = float, default = 0.1)
+
+	compare_parser = commands.add_parser('compare', help = 'compare results against a baseline')
+	compare_parser.add_argument('results')
+	compare_parser.add_argument('baseline')
+	compare_parser.add_argument('--threshold', type = float, default = 0.1)
+
+	args = parser.parse_args(args)
+	if args.command == 'run':
+		scenarios = [scenario for scenario in suite(args.suite)
+		 if args.only is None or args.only in scenario['name']]
+		results = run(scenarios, args.repeats, args.output)
+		if args.baseline is None:
+			return 0
+	else:
+		with open(args.results) as f:
+			results = json.load(f)
+	with open(args.baseline) as f:
+		baseline = json.load(f)
+	regressions = compare(results, baseline, args.threshold)
+	for regression in regressions:
+		print('Regression in ' + regression)
+	return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,85 @@
+import json
+import platform
+import time
+import tracemalloc
+import numpy as np
+from ..main import Amplifier
+from .scenarios import make_inputs
+
+
+def measure(scenario, repeats = 7):
+	"""
+	Runs a scenario repeats times after a warm-up run and returns the
+	median and interquartile range of the runtime (seconds) along with
+	the peak memory (bytes) of one more run traced with tracemalloc.
+	"""
+	references, signal = make_inputs(scenario)
+	amplifier = Amplifier(**scenario['amplifier'])
+	amplifier.amplify(references, signal, **scenario['amplify'])
+	runtimes = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		amplifier.amplify(references, signal, **scenario['amplify'])
+		runtimes.append(time.perf_counter() - start)
+
+	tracing = tracemalloc.is_tracing()
+	if not tracing:
+		tracemalloc.start()
+	tracemalloc.reset_peak()
+	start_memory = tracemalloc.get_traced_memory()[0]
+	amplifier.amplify(references, signal, **scenario['amplify'])
+	peak_memory = tracemalloc.get_traced_memory()[1] - start_memory
+	if not tracing:
+		tracemalloc.stop()
+
+	quartiles = np.percentile(runtimes, [25, 50, 75])
+	return {'median' : float(quartiles[1]), 'iqr' : float(quartiles[2] - quartiles[0]),
+	 'repeats' : repeats, 'peak memory' : int(peak_memory)}
+
+
+def run(scenarios, repeats = 7, path = None, report = print):
+	"""
+	Measures each scenario (see measure) and returns the results, which
+	are also written to path as JSON if given. report is called with a
+	line for each scenario as it finishes.
+	"""
+	results = {'machine' : {'platform' : platform.platform(), 'python' : platform.python_version(),
+	 'numpy' : np.__version__}, 'scenarios' : {}}
+	for scenario in scenarios:
+		result = measure(scenario, repeats)
+		result['scenario'] = scenario
+		results['scenarios'][scenario['name']] = result
+		if report is not None:
+			report('{:<40} {:10.4g} s +- {:8.2g} s {:12d} B'.format(scenario['name'],
+			 result['median'], result['iqr'], result['peak memory']))
+	if path is not None:
+		with open(path, 'w') as f:
+			json.dump(results, f, indent = 1)
+	return results
+
+
+def compare(results, baseline, threshold = 0.1):
+	"""
+	Compares benchmark results against a baseline (both as returned by
+	run). A scenario regresses if its median runtime or peak memory is
+	more than a fraction threshold above the baseline. For runtimes, the
+	increase must also exceed the combined interquartile range so noisy
+	scenarios don't fail.
+	Returns
+	-------
+	regressions : list of strings
+		A description of each regression.
+	"""
+	regressions = []
+	for name, result in results['scenarios'].items():
+		if name not in baseline['scenarios']:
+			continue
+		base = baseline['scenarios'][name]
+		increase = result['median'] - base['median']
+		if increase > threshold * base['median'] and increase > result['iqr'] + base['iqr']:
+			regressions.append('{}: runtime {:.4g} s, baseline {:.4g} s'.format(name,
+			 result['median'], base['median']))
+		if result['peak memory'] > (1 + threshold) * base['peak memory']:
+			regressions.append('{}: peak memory {} B, baseline {} B'.format(name,
+			 result['peak memory'], base['peak memory']))
+	return regressions
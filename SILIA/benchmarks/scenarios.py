@@ -0,0 +1,77 @@
+import numpy as np
+from .. import synth
+
+
+#The four runtime curves of Fig. 4 in the paper.
+RUNTIME_TYPES = {
+	'fit interp' : {'fit_ref' : True, 'interpolate' : True},
+	'no fit interp' : {'fit_ref' : False, 'interpolate' : True},
+	'fit no interp' : {'fit_ref' : True, 'interpolate' : False},
+	'no fit no interp' : {'fit_ref' : False, 'interpolate' : False},
+}
+
+
+def scenario(name, num_samples, shape = (1,), num_refs = 1, amplifier = None, **amplify):
+	"""
+	Returns a benchmark scenario, a lock-in of num_samples samples of a
+	signal with channels of the given shape against num_refs references.
+	amplifier holds the arguments for the Amplifier (cutoff 0 by default)
+	and the remaining arguments are passed to amplify.
+	"""
+	amplifier = dict({'cutoff' : 0, 'pbar' : False}, **(amplifier or {}))
+	return {'name' : name, 'num samples' : int(num_samples), 'shape' : list(shape),
+	 'num refs' : num_refs, 'amplifier' : amplifier, 'amplify' : amplify}
+
+
+def fig4_scenarios(samples, channels, refs):
+	"""
+	Returns the scenarios of the runtime curves in Fig. 4, the runtime
+	against the number of samples, channels and references, for each
+	combination of fitting and interpolation.
+	"""
+	scenarios = []
+	for runtime_type, options in RUNTIME_TYPES.items():
+		for num_samples in samples:
+			scenarios.append(scenario('samples ' + str(num_samples) + ', ' + runtime_type,
+			 num_samples, **options))
+		for num_channels in channels:
+			scenarios.append(scenario('channels ' + str(num_channels) + ', ' + runtime_type,
+			 4096, (num_channels,), **options))
+		for num_refs in refs:
+			scenarios.append(scenario('references ' + str(num_refs) + ', ' + runtime_type,
+			 4096, num_refs = num_refs, **options))
+	return scenarios
+
+
+def suite(name = 'quick'):
+	"""
+	Returns the scenarios of the 'quick' or 'full' benchmark suite: the
+	Fig. 4 curves plus an image stack with errorbars and a long record
+	through the FFT and streaming (FIR) lowpass filters.
+	"""
+	if name == 'quick':
+		scenarios = fig4_scenarios([2**12, 2**16], [100, 1000], [1, 10])
+		scenarios.append(scenario('image stack', 1000, (32, 32), num_windows = 4, window_size = 0.5))
+		long_record = 2**20
+	elif name == 'full':
+		scenarios = fig4_scenarios(np.round(np.power(1.1, np.arange(50, 122, 8))).astype(int),
+		 np.arange(100, 1001, 300), [1, 4, 7, 10])
+		scenarios.append(scenario('image stack', 2000, (128, 128), num_windows = 4, window_size = 0.5))
+		long_record = 2**23
+	else:
+		raise ValueError("Unknown benchmark suite: " + str(name))
+	scenarios.append(scenario('long record fft', long_record, (4,), amplifier = {'cutoff' : 1e-3}))
+	scenarios.append(scenario('long record fir', long_record, (4,),
+	 amplifier = {'cutoff' : 1e-3, 'lowpass' : 'fir'}))
+	return scenarios
+
+
+def make_inputs(scenario, seed = 0):
+	"""
+	Returns the references and signal input for a scenario, sine waves at
+	a tenth of the sampling rate in Gaussian noise.
+	"""
+	time = synth.timestamps(scenario['num samples'], 1)
+	frequencies = 0.1 * (1 + 0.05 * np.arange(scenario['num refs']))
+	signal = synth.signal(time, scenario['shape'], [synth.component(frequencies[0])], rng = seed)
+	return synth.references(time, frequencies), {'time' : time, 'signal' : signal}
@@ -0,0 +1,127 @@
+import numpy as np
+import threading
+import numpy.fft
+import scipy.fft
+try:
+	import pyfftw
+	import pyfftw.builders
+except ImportError:
+	pyfftw = None
+
+
+class NumpyBackend:
+	"""
+	Real and complex FFTs along an axis with numpy.fft. If fast_len is True, 
+	transforms are zero-padded to a length that factors into small
+	primes (see padded_length).
+	"""
+	def __init__(self, fast_len = False):
+		self.fast_len = fast_len
+
+	def padded_length(self, n):
+		"""
+		Returns the transform length used for n samples.
+		"""
+		if self.fast_len:
+			return scipy.fft.next_fast_len(n, real = True)
+		return n
+
+	def rfft(self, data, n, axis = 0):
+		return numpy.fft.rfft(data, n, axis = axis)
+
+	def irfft(self, data, n, axis = 0):
+		return numpy.fft.irfft(data, n, axis = axis)
+
+	def fft(self, data, n, axis = 0):
+		return numpy.fft.fft(data, n, axis = axis)
+
+	def ifft(self, data, n, axis = 0):
+		return numpy.fft.ifft(data, n, axis = axis)
+
+
+class ScipyBackend(NumpyBackend):
+	"""
+	Real and complex FFTs with scipy.fft, which splits batched transforms (several 
+	channels at once) between workers threads. 
+	"""
+	def __init__(self, workers = None, fast_len = False):
+		NumpyBackend.__init__(self, fast_len)
+		self.workers = workers
+
+	def rfft(self, data, n, axis = 0):
+		return scipy.fft.rfft(data, n, axis = axis, workers = self.workers)
+
+	def irfft(self, data, n, axis = 0):
+		return scipy.fft.irfft(data, n, axis = axis, workers = self.workers)
+
+	def fft(self, data, n, axis = 0):
+		return scipy.fft.fft(data, n, axis = axis, workers = self.workers)
+
+	def ifft(self, data, n, axis = 0):
+		return scipy.fft.ifft(data, n, axis = axis, workers = self.workers)
+
+
+class FFTWBackend(NumpyBackend):
+	"""
+	Real and complex FFTs with pyFFTW using workers threads. Plans are made once for
+	each array shape and reused. Each thread has its own plans, since a plan's 
+	buffers can't be used by two threads at once (windows are demodulated on 
+	several threads).
+	"""
+	def __init__(self, workers = None, fast_len = False):
+		if pyfftw is None:
+			raise ImportError("The 'fftw' backend needs pyFFTW to be installed")
+		NumpyBackend.__init__(self, fast_len)
+		self.workers = workers
+		self.local = threading.local()
+
+	def __getstate__(self):
+		#Plans can't be pickled, they are made again when needed.
+		state = self.__dict__.copy()
+		del state['local']
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.local = threading.local()
+
+	def plan(self, builder, data, n, axis):
+		plans = self.local.__dict__.setdefault('plans', {})
+		key = (builder.__name__, data.shape, data.dtype.str, n, axis)
+		if key not in plans:
+			plans[key] = builder(data, n, axis = axis, threads = self.workers or 1)
+		return plans[key]
+
+	def rfft(self, data, n, axis = 0):
+		data = np.asarray(data)
+		return self.plan(pyfftw.builders.rfft, data, n, axis)(data).copy()
+
+	def irfft(self, data, n, axis = 0):
+		data = np.asarray(data)
+		return self.plan(pyfftw.builders.irfft, data, n, axis)(data).copy()
+
+	def fft(self, data, n, axis = 0):
+		data = np.asarray(data)
+		return self.plan(pyfftw.builders.fft, data, n, axis)(data).copy()
+
+	def ifft(self, data, n, axis = 0):
+		data = np.asarray(data)
+		return self.plan(pyfftw.builders.ifft, data, n, axis)(data).copy()
+
+
+def get_backend(name = 'numpy', workers = None, fast_len = False):
+	"""
+	Returns the FFT backend with the given name: 'numpy', 'scipy', 'fftw'
+	or 'auto' (pyFFTW if it is installed, otherwise scipy). workers is the
+	number of threads for the scipy and pyFFTW backends (scipy accepts -1
+	for all cores). 
+	"""
+	if name == 'auto':
+		name = 'fftw' if pyfftw is not None else 'scipy'
+	if name == 'numpy':
+		return NumpyBackend(fast_len)
+	elif name == 'scipy':
+		return ScipyBackend(workers, fast_len)
+	elif name == 'fftw':
+		return FFTWBackend(workers, fast_len)
+	raise ValueError("Unknown FFT backend: " + str(name))
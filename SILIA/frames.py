@@ -0,0 +1,230 @@
+import glob
+import os
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .reference_signal import fit
+from .helper import get_window, check_window, rc_sos, iir_lowpass, iir_time_constant
+from .progress import get_observer
+from .oscillator import reference_blocks
+
+
+class FrameSource:
+	"""
+	A stack of frames (for example images from a camera) read a block
+	of frames at a time, so stacks larger than memory can be locked in.
+	Subclasses set time (the timestamp of each frame), shape (the shape
+	of a frame) and dtype, and implement read.
+	"""
+	def __len__(self):
+		return len(self.time)
+
+	def read(self, start, stop):
+		"""
+		Returns frames start to stop as an array of shape (stop - start,) + shape.
+		"""
+		raise NotImplementedError
+
+
+def frame_times(num_frames, time, frame_rate):
+	"""
+	Returns the timestamps of the frames, time if given, otherwise frames
+	evenly spaced at frame_rate (Hz).
+	"""
+	if time is not None:
+		time = np.asarray(time, dtype = np.float64)
+		if len(time) != num_frames:
+			raise ValueError("Got " + str(len(time)) + " timestamps for " + str(num_frames) + " frames")
+		return time
+	if frame_rate is None:
+		raise ValueError("Either the timestamps or the frame rate of the frames is needed")
+	return np.arange(num_frames)/frame_rate
+
+
+class ArrayFrames(FrameSource):
+	"""
+	Frames from an array (or memmap) with time along the first axis.
+	"""
+	def __init__(self, array, time = None, frame_rate = None):
+		self.array = array
+		self.shape = tuple(array.shape[1:])
+		self.dtype = array.dtype
+		self.time = frame_times(len(array), time, frame_rate)
+
+	def read(self, start, stop):
+		return np.asarray(self.array[start : stop])
+
+
+class RawFrames(ArrayFrames):
+	"""
+	Frames from a raw binary video file, frames of the given shape and
+	dtype stored one after another after a header of offset bytes. The
+	file is memory-mapped, so frames are only read from disk when needed.
+	"""
+	def __init__(self, path, shape, dtype, time = None, frame_rate = None, offset = 0):
+		frame_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+		num_frames = (os.path.getsize(path) - offset)//frame_bytes
+		array = np.memmap(path, dtype = dtype, mode = 'r', offset = offset,
+		 shape = (num_frames,) + tuple(shape))
+		ArrayFrames.__init__(self, array, time, frame_rate)
+
+
+def read_image(path):
+	"""
+	Returns the image at path as an array, using tifffile for TIFF files
+	if it is installed and Pillow otherwise.
+	"""
+	if path.lower().endswith(('.tif', '.tiff')):
+		try:
+			import tifffile
+			return tifffile.imread(path)
+		except ImportError:
+			pass
+	try:
+		from PIL import Image
+	except ImportError:
+		raise ImportError("Reading images needs Pillow (or tifffile for TIFF files)")
+	with Image.open(path) as image:
+		return np.asarray(image)
+
+
+class ImageSequence(FrameSource):
+	"""
+	Frames from a sequence of image files (for example TIFF or PNG), one
+	frame per file. paths is a list of files or a glob pattern, which is
+	sorted by name.
+	"""
+	def __init__(self, paths, time = None, frame_rate = None):
+		if isinstance(paths, str):
+			paths = sorted(glob.glob(paths))
+		if not paths:
+			raise ValueError("No images found")
+		self.paths = list(paths)
+		first = read_image(self.paths[0])
+		self.shape = first.shape
+		self.dtype = first.dtype
+		self.time = frame_times(len(self.paths), time, frame_rate)
+
+	def read(self, start, stop):
+		return np.stack([read_image(path) for path in self.paths[start : stop]])
+
+
+def prefetch(source, block_frames, depth = 2):
+	"""
+	Yields the start of each block of block_frames frames and the frames,
+	reading up to depth blocks ahead on a background thread so reading
+	from disk overlaps with the lock-in.
+	"""
+	with ThreadPoolExecutor(max_workers = 1) as executor:
+		pending = deque()
+		for start in range(0, len(source), block_frames):
+			pending.append((start, executor.submit(source.read, start, min(start + block_frames, len(source)))))
+			if len(pending) > depth:
+				start, future = pending.popleft()
+				yield start, future.result()
+		while pending:
+			start, future = pending.popleft()
+			yield start, future.result()
+
+
+def stream_lock_in(self, source, references, fit_ref = True, block_frames = 64, depth = 2):
+	"""
+	Applies lock-in to the frames of source while reading them a block
+	at a time, for every reference in a single pass over the frames. The
+	frames must be evenly spaced in time. With the 'fft' lowpass and a
+	cutoff of 0, the filtered signal is the mean of the mixed signal,
+	which is accumulated, so the output is the same as amplify's. With
+	the 'iir' lowpass, the filter state is carried from block to block.
+	Parameters
+	----------
+	source : FrameSource
+		The frames.
+	references : list of dicts
+		Reference signals as for amplify. Without a fit, each reference
+		must be sampled at the timestamps of the frames.
+	fit_ref : bool
+		Whether to fit the references to sine waves.
+	block_frames : int
+		Number of frames read and demodulated at once.
+	depth : int
+		Number of blocks read ahead, see prefetch.
+	Returns
+	-------
+	fit_params : list or None
+		Fitted parameters of each reference, None without a fit.
+	magnitudes, phases : lists of arrays
+		Magnitude and phase (None without a fit) images for each reference.
+	"""
+	if self.prefilter is not None:
+		raise ValueError("Frames can't be prefiltered")
+	check_window(self, self.cutoff)
+	if self.lowpass == 'iir':
+		time_constant = iir_time_constant(self)
+	elif self.lowpass != 'fft' or self.cutoff != 0:
+		raise ValueError("Frames can only be streamed with the 'iir' lowpass or a cutoff of 0")
+	time = source.time
+	num_frames = len(time)
+	window = get_window(self.window, num_frames)
+	num_pixels = int(np.prod(source.shape))
+	quadratures = 2 if fit_ref else 1
+
+	if fit_ref:
+		fit_params = fit(references)
+		#References generated lazily a block at a time, in step with the frames
+		ref_blocks = [reference_blocks(time, params[0], params[1], block_frames) for params in fit_params]
+	else:
+		fit_params = None
+		for ref in references:
+			if len(ref['signal']) != num_frames:
+				raise ValueError("Without a fit, references must be sampled at the frame timestamps")
+	if self.lowpass == 'iir':
+		sos = rc_sos(time_constant, self.slope, num_frames/(time[-1] - time[0]))
+		states = [[None] * quadratures for _ in references]
+	#Sums of the mixed (cutoff 0) or of the filtered magnitudes and phases (iir)
+	sums = np.zeros((len(references), 2, num_pixels))
+
+	observer = get_observer(self.pbar)
+	observer.started('frames', num_frames)
+	for start, frames in prefetch(source, block_frames, depth):
+		stop = start + len(frames)
+		frames = np.reshape(frames, (len(frames), num_pixels)).astype(np.float64)
+		for j, ref in enumerate(references):
+			if fit_ref:
+				_, ref_vals, ref_vals_phaseShift = next(ref_blocks[j])
+				ref_vals = [ref_vals, ref_vals_phaseShift]
+			else:
+				ref_vals = [np.asarray(ref['signal'])[start : stop]]
+			#The 2 is a scaling factor
+			mixed = [frames * (2 * vals * window[start : stop]).reshape((-1, 1)) for vals in ref_vals]
+			if self.lowpass == 'fft':
+				for k in range(quadratures):
+					sums[j, k] += np.sum(mixed[k], axis = 0)
+				continue
+			filtered = []
+			for k in range(quadratures):
+				curr_filtered, states[j][k] = iir_lowpass(mixed[k], sos, states[j][k])
+				#The factor of 2 matches the gain of the FFT lowpass.
+				filtered.append(2 * curr_filtered)
+			if fit_ref:
+				sums[j, 0] += np.sum(np.hypot(filtered[0], filtered[1]), axis = 0)
+				sums[j, 1] += np.sum(np.arctan2(filtered[1], filtered[0]), axis = 0)
+			else:
+				sums[j, 0] += np.sum(np.absolute(filtered[0]), axis = 0)
+		observer.progress('frames', stop, num_frames)
+	observer.finished('frames')
+
+	magnitudes = []
+	phases = []
+	for j in range(len(references)):
+		if self.lowpass == 'fft':
+			#The cutoff 0 lowpass doubles the mean of the mixed signal.
+			in_phase, quadrature = 2 * sums[j]/num_frames
+			if fit_ref:
+				magnitude, phase = np.hypot(in_phase, quadrature), np.arctan2(quadrature, in_phase)
+			else:
+				magnitude, phase = np.absolute(in_phase), None
+		else:
+			magnitude, phase = sums[j, 0]/num_frames, sums[j, 1]/num_frames if fit_ref else None
+		magnitudes.append(np.reshape(magnitude, source.shape))
+		phases.append(None if phase is None else np.reshape(phase, source.shape))
+	return fit_params, magnitudes, phases
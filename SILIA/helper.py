@@ -1,9 +1,15 @@
 import numpy as np
-from numpy.fft import rfft, irfft, rfftfreq
-from tqdm import trange
+from numpy.fft import rfft, irfft, fft, ifft
 import scipy.interpolate
-import scipy.stats as sp
+import scipy.signal
 import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+from .accumulators import RunningStats, CircularStats
+from .instrument import stage, bind
+from .progress import get_observer
+from .oscillator import reference_values
+from .kernels import get_kernel
 
 
 def find_nearest(array, value):
@@ -32,8 +38,75 @@ def refValue_phaseShift (t, est_freq, est_phase):
 	return np.cos(est_freq*t*2*np.pi + est_phase)
 
 
+def get_window(name, num_rows):
+	"""
+	Returns the window applied to the mixed signal before filtering.
+	'hanning' is the default window. The 'rectangular', 'blackman' 
+	and 'flattop' windows are scaled to the mean of the Hanning window
+	so they all give the same lock-in magnitudes. The flattop window
+	can only be used when the lowpass keeps the mean, see check_window.
+	"""
+	if name == 'hanning':
+		return np.hanning(num_rows)
+	elif name == 'rectangular':
+		return 0.5 * np.ones(num_rows)
+	elif name == 'blackman':
+		window = np.blackman(num_rows)
+	elif name == 'flattop':
+		window = scipy.signal.windows.flattop(num_rows)
+	else:
+		raise ValueError("Unknown window: " + str(name))
+	return window * 0.5/np.mean(window)
 
-def mix(signal, time, est_freq, est_phase, interpolate, pbar):
+
+def check_window(self, cutoff):
+	"""
+	Raises a ValueError if the amplifier's window can't be used with its
+	lowpass at cutoff. The flattop window has negative lobes, so the
+	filtered signal changes sign and the mean magnitude and phase are
+	biased, unless the lowpass only keeps the mean (the 'fft' lowpass 
+	with a cutoff of 0).
+	"""
+	if self.window == 'flattop' and (cutoff != 0 or self.lowpass not in ['fft', 'auto']):
+		raise ValueError("The flattop window needs the 'fft' lowpass with a cutoff of 0")
+
+
+def scatter(values, mask, fill_value = np.nan):
+	"""
+	Returns an array with the channel shape of mask along the last axes,
+	with values (the last axis of which has an entry for each selected
+	channel) where mask is True and fill_value elsewhere.
+	"""
+	values = np.asarray(values, dtype = float)
+	out = np.full(values.shape[:-1] + mask.shape, fill_value, dtype = float)
+	out[..., mask] = values
+	return out
+
+
+def even_timesteps(time):
+	"""
+	Returns evenly spaced timestamps spanning the same interval, 
+	with the same number of samples, as the given timestamps.
+	"""
+	min_time = min(time)
+	max_time = max(time)
+	len_time = len(time)
+	timestep = (max_time - min_time)/len_time
+	return np.arange(min_time, max_time, timestep)
+
+
+def resample(signal, time, even_time):
+	"""
+	Linearly interpolates the signal (along the first axis) from its 
+	timestamps onto even_time.
+	"""
+	with stage('resample', signal = signal):
+		interpolated = scipy.interpolate.interp1d(time, signal, bounds_error=False,
+		 kind='linear', axis = 0, fill_value = "extrapolate")
+		return interpolated(even_time)
+
+
+def mix(signal, time, est_freq, est_phase, interpolate, pbar, window = 'hanning'):
 	"""
 	Performs the signal mixing step of a lock in amplifier.
 	Mixes, or multiplies, the intensity signal for all channels
@@ -51,6 +124,8 @@ def mix(signal, time, est_freq, est_phase, interpolate, pbar):
 		Estimated frequency of the reference signal.
 	est_phase : float
 		Estimated phase of the reference signal.
+	window : string
+		Name of the window to apply, see get_window.
 	Returns
 	-------
 	mixed : 2D array of floats
@@ -60,44 +135,142 @@ def mix(signal, time, est_freq, est_phase, interpolate, pbar):
 		signal multiplied by phase shifted reference signal.
 		Same formatting as mixed. 
 	"""
-	if pbar:
-		print("Mixing...", flush = True)
+	observer = get_observer(pbar)
+	observer.started('mix')
 	if interpolate:
-		min_time = min(time)
-		max_time = max(time)
-		len_time = len(time)
-		timestep = (max_time - min_time)/len_time
-		even_time = np.arange(min_time, max_time, timestep)
-		interpolated = scipy.interpolate.interp1d(time, signal, bounds_error=False,
-		 kind='linear', axis = 0, fill_value = "extrapolate")
-		signal = interpolated(even_time)
-		ref_vals = refValue(even_time, est_freq, est_phase)
-		ref_vals_phaseShift = refValue_phaseShift(even_time, est_freq, est_phase)
+		even_time = even_timesteps(time)
+		signal = resample(signal, time, even_time)
+		ref_vals, ref_vals_phaseShift = reference_values(even_time, est_freq, est_phase)
 	else:
-		ref_vals = refValue(time, est_freq, est_phase)
-		ref_vals_phaseShift = refValue_phaseShift(time, est_freq, est_phase)
+		ref_vals, ref_vals_phaseShift = reference_values(time, est_freq, est_phase)
 
 	num_rows = len(signal)
-	mixed = np.multiply(signal, np.array([ref_vals]).T) * 2 #The 2 is a scaling factor
-	mixed_phaseShift = np.multiply(signal, np.array([ref_vals_phaseShift]).T) * 2 #The 2 is a scaling factor
+	with stage('mix', signal = signal):
+		mixed = np.multiply(signal, np.array([ref_vals]).T) * 2 #The 2 is a scaling factor
+		mixed_phaseShift = np.multiply(signal, np.array([ref_vals_phaseShift]).T) * 2 #The 2 is a scaling factor
 
-	window = np.hanning(num_rows)
-	mixed = mixed * window.reshape((window.size, 1))
-	mixed_phaseShift = mixed_phaseShift * window.reshape((window.size, 1))
+	with stage('window', mixed = mixed):
+		window = get_window(window, num_rows)
+		mixed = mixed * window.reshape((window.size, 1))
+		mixed_phaseShift = mixed_phaseShift * window.reshape((window.size, 1))
+	observer.finished('mix')
 	if interpolate:
 		return mixed, mixed_phaseShift, even_time
 	else:
 		return mixed, mixed_phaseShift, time
 
 
+def mix_complex(signal, time, est_freq, est_phase, interpolate, pbar, window = 'hanning'):
+	"""
+	Performs the signal mixing step with the fitted reference as a single
+	complex reference, sin + i cos of its phase, so the mixed signal and
+	the phase shifted mixed signal of mix are the real and imaginary 
+	parts of one complex array. The window and scaling factor are folded 
+	into the reference, so the signal is only multiplied once.
+	Returns
+	-------
+	mixed : 2D array of complex
+		signal multiplied by the complex reference signal.
+	time : 1D array of floats
+		Timestamps of the mixed signal, evenly spaced if interpolated.
+	"""
+	observer = get_observer(pbar)
+	observer.started('mix')
+	if interpolate:
+		even_time = even_timesteps(time)
+		signal = resample(signal, time, even_time)
+		time = even_time
+	with stage('window'):
+		ref_vals, ref_vals_phaseShift = reference_values(time, est_freq, est_phase)
+		#The 2 is a scaling factor
+		reference = 2 * get_window(window, len(signal)) * (ref_vals + 1j * ref_vals_phaseShift)
+	with stage('mix', signal = signal):
+		mixed = signal * reference.reshape((-1, 1))
+	observer.finished('mix')
+	return mixed, time
+
+
+def decimation_stages(cutoff, f_s, num_samples, oversample = 10, min_samples = 256, max_stage = 8):
+	"""
+	Returns the list of decimation factors for a multistage decimation
+	of a signal sampled at f_s so the output rate is still oversample 
+	times the cutoff frequency. At least min_samples samples are kept
+	and each stage decimates by at most max_stage. 
+	"""
+	factor = num_samples//min_samples
+	if cutoff > 0:
+		factor = min(factor, int(f_s/(oversample * cutoff)))
+	stages = []
+	while factor >= 2:
+		stage_factor = min(max_stage, factor)
+		stages.append(stage_factor)
+		factor = factor//stage_factor
+	return stages
+
+
+def cic_decimate(data, factor, order = 4):
+	"""
+	Decimates data along the first axis with a cascaded integrator-comb
+	filter of the given order, normalized to unity gain at DC. Each
+	integrator-comb pair is a moving average of length factor, with the
+	signal taken to be zero before the first sample so the output keeps
+	the same sum as the input.
+	"""
+	for i in range(order):
+		summed = np.cumsum(data, axis = 0)
+		summed[factor:] -= summed[:-factor].copy()
+		data = summed/factor
+	return data[::factor]
+
+
+def decimate(data, time, cutoff, method = 'polyphase'):
+	"""
+	Lowpass filters and downsamples the mixed signal so the expensive
+	lowpass filter runs on a shorter record. The decimation factor is
+	chosen from the cutoff and sampling frequencies (see decimation_stages).
+	Parameters
+	----------
+	data : 2D array of floats
+		Mixed signal, each row is a timestamp.
+	time : 1D array of floats
+		Timestamps for the mixed signal.
+	cutoff : float
+		Cutoff frequency for the lowpass filter applied afterwards.
+	method : string
+		'polyphase' for a polyphase FIR filter or 'cic' for a 
+		cascaded integrator-comb filter.
+	Returns
+	-------
+	data : 2D array of floats
+		Decimated mixed signal.
+	time : 1D array of floats
+		Timestamps for the decimated signal.
+	"""
+	timeSteps = len(time)
+	totalTime = time[timeSteps - 1] - time[0]
+	sample_rate = timeSteps/totalTime
+	for factor in decimation_stages(cutoff, sample_rate, timeSteps):
+		num_in = len(data)
+		if method == 'polyphase':
+			data = scipy.signal.resample_poly(data, 1, factor, axis = 0)
+		elif method == 'cic':
+			data = cic_decimate(data, factor)
+		else:
+			raise ValueError("Unknown decimation method: " + str(method))
+		#Rescales so the rounded up output length doesn't bias the mean.
+		data = data * (len(data) * factor/num_in)
+		time = time[::factor][:len(data)]
+	return data, time
+
 
-def fft_lowpass(data, cutoff, f_s, timesteps):
+def fft_lowpass(data, cutoff, f_s, timesteps, backend = None, crop = True):
 	"""
-	Lowpass filter using the numpy fft algorithm.
-	Used to filter the mixed signal for single channels
+	Lowpass filter using the numpy fft algorithm, or the given FFT backend.
+	Used to filter the mixed signal for single channels, or for several
+	channels at once along the first axis.
 	Parameters
 	----------
-	data : 1D array of floats
+	data : 1D or 2D array of floats
 	    Signal data over time. 
 	cutoff : float
 		Cutoff frequency for lowpass filter.
@@ -105,28 +278,152 @@ def fft_lowpass(data, cutoff, f_s, timesteps):
 	    Sampling frequency of the intensity values. 
 	timesteps : float
 		Number of timesteps for signal data
+	backend : FFT backend (see fft_backend.py)
+		Backend used for the transforms, numpy.fft if None. The backend
+		may zero-pad the data to a faster transform length.
+	crop : bool
+		Whether to crop zero-padded output back to the length of the data.
 	
 	Returns
 	-------
-	filtered_signal : 1D array of floats
+	filtered_signal : 1D or 2D array of floats
 		Signal after being filtered. 
 	"""
 	n = len(data)
-	fourier = rfft(data)
+	with stage('fft', data = data):
+		if backend is None:
+			padded = n
+			fourier = rfft(data, axis = 0)
+		else:
+			padded = backend.padded_length(n)
+			fourier = backend.rfft(data, padded, axis = 0)
 
-	frequencies = rfftfreq(timesteps) * f_s
-	index_upper = int(cutoff * timesteps/f_s)
-	mask = np.zeros(fourier.size)
-	mask[range(index_upper + 1)] = 2
-	fourier *= mask
-	filtered_signal = irfft(fourier)
+	with stage('mask', fourier = fourier):
+		index_upper = int(cutoff * padded/f_s)
+		mask = np.zeros(len(fourier))
+		mask[range(index_upper + 1)] = 2
+		fourier *= mask.reshape((-1,) + (1,) * (fourier.ndim - 1))
+	with stage('inverse fft', fourier = fourier):
+		if backend is None:
+			filtered_signal = irfft(fourier, n, axis = 0)
+		else:
+			filtered_signal = backend.irfft(fourier, padded, axis = 0)
+	if crop:
+		return filtered_signal[:n]
 	return filtered_signal
 
 
-def apply_lowpass(mixed, mixed_phaseShift, time, cutoff, pbar):
+def complex_lowpass(data, cutoff, f_s, backend = None):
+	"""
+	Lowpass filter for complex data, such as the complex mixed signal 
+	of mix_complex, with one complex FFT. The response is the same as
+	fft_lowpass for the real and imaginary parts: a gain of 2 up to the
+	cutoff for positive and negative frequencies.
+	Parameters
+	----------
+	data : 2D array of complex
+	    Signal data over time, for several channels.
+	cutoff : float
+		Cutoff frequency for lowpass filter.
+	f_s : float
+	    Sampling frequency of the intensity values. 
+	backend : FFT backend (see fft_backend.py)
+		Backend used for the transforms, numpy.fft if None.
+	Returns
+	-------
+	filtered_signal : 2D array of complex
+		Signal after being filtered, including any zero-padding.
+	"""
+	n = len(data)
+	with stage('fft', data = data):
+		if backend is None:
+			padded = n
+			fourier = fft(data, axis = 0)
+		else:
+			padded = backend.padded_length(n)
+			fourier = backend.fft(data, padded, axis = 0)
+
+	with stage('mask', fourier = fourier):
+		index_upper = int(cutoff * padded/f_s)
+		mask = np.zeros(padded)
+		mask[:index_upper + 1] = 2
+		if index_upper > 0:
+			mask[padded - index_upper:] = 2
+		fourier *= mask.reshape((-1,) + (1,) * (fourier.ndim - 1))
+	with stage('inverse fft', fourier = fourier):
+		if backend is None:
+			return ifft(fourier, axis = 0)
+		return backend.ifft(fourier, padded, axis = 0)
+
+
+def mixed_spectra(self, mixed, mixed_phaseShift, time):
+	"""
+	Returns the forward transforms of the mixed signals, so the lowpass
+	filter can be applied for any number of cutoffs with lowpass_spectra.
+	mixed_phaseShift may be None (no fit lock-in).
+	"""
+	timeSteps = len(time)
+	totalTime = time[timeSteps - 1] - time[0]
+	padded = self.fft_backend.padded_length(timeSteps)
+	with stage('fft', mixed = mixed):
+		spectra = {'time steps' : timeSteps, 'padded' : padded, 'sample rate' : timeSteps/totalTime,
+		 'fourier' : self.fft_backend.rfft(mixed, padded, axis = 0), 'fourier phase shift' : None}
+		if mixed_phaseShift is not None:
+			spectra['fourier phase shift'] = self.fft_backend.rfft(mixed_phaseShift, padded, axis = 0)
+	return spectra
+
+
+def lowpass_spectra(self, spectra, cutoff):
+	"""
+	Masks the spectra from mixed_spectra at the cutoff frequency and
+	transforms them back, channel_block channels at a time, to get the
+	magnitudes and phases (None for the no fit lock-in) for each channel,
+	as apply_lowpass does.
+	"""
+	check_window(self, cutoff)
+	if cutoff > spectra['sample rate']/2:
+		raise ValueError("The cutoff " + str(cutoff) + " Hz is above the Nyquist frequency of the retained "
+		 "spectra, " + str(spectra['sample rate']/2) + " Hz")
+	timeSteps = spectra['time steps']
+	padded = spectra['padded']
+	index_upper = int(cutoff * padded/spectra['sample rate'])
+	mask = np.zeros((len(spectra['fourier']), 1))
+	mask[range(index_upper + 1)] = 2
+	num_channels = spectra['fourier'].shape[1]
+	r = []
+	theta = []
+	for i in range(0, num_channels, self.channel_block):
+		with stage('inverse fft', fourier = spectra['fourier'][:, i : i + self.channel_block]):
+			filtered = self.fft_backend.irfft(spectra['fourier'][:, i : i + self.channel_block] * mask,
+			 padded, axis = 0)
+			if spectra['fourier phase shift'] is not None:
+				filtered_phaseShift = self.fft_backend.irfft(spectra['fourier phase shift'][:, i : i + self.channel_block] * mask,
+				 padded, axis = 0)
+		with stage('reduce', filtered = filtered):
+			if spectra['fourier phase shift'] is None:
+				r.extend(np.sum(np.absolute(filtered), axis = 0)/timeSteps)
+				continue
+			r.extend(np.sum(np.hypot(filtered, filtered_phaseShift), axis = 0)/timeSteps)
+			theta.extend(np.mean(np.arctan2(filtered_phaseShift[:timeSteps], filtered[:timeSteps]), axis = 0))
+	if spectra['fourier phase shift'] is None:
+		return np.asarray(r), None
+	return np.asarray(r), np.asarray(theta)
+
+
+def decimate_mixed(mixed, mixed_phaseShift, time, cutoff, method):
+	"""
+	Decimates both the mixed and phase shifted mixed signals, see decimate.
+	"""
+	decimated, _ = decimate(mixed, time, cutoff, method)
+	decimated_phaseShift, time = decimate(mixed_phaseShift, time, cutoff, method)
+	return decimated, decimated_phaseShift, time
+
+
+def apply_lowpass(mixed, mixed_phaseShift, time, cutoff, pbar, backend = None, channel_block = 1):
 	"""
 	Applies lowpass filter to the mixed signals to get cartesian lock in values
-	for each measured channel.
+	for each measured channel. Each block of channels is combined into
+	one complex array and filtered with apply_lowpass_complex.
 	Parameters
 	----------
 	mixed : 2D array of floats
@@ -139,9 +436,24 @@ def apply_lowpass(mixed, mixed_phaseShift, time, cutoff, pbar):
 		Timestamps for each signal measurement.
 	cutoff : float
 		Cutoff frequency for lowpass filter.
+	backend : FFT backend
+		Backend for the transforms, see fft_lowpass.
+	channel_block : int
+		Number of channels transformed together.
+	"""
+	return apply_lowpass_complex(mixed, time, cutoff, pbar, backend, channel_block, mixed_phaseShift)
+
+
+def apply_lowpass_complex(mixed, time, cutoff, pbar, backend = None, channel_block = 1,
+ mixed_phaseShift = None):
+	"""
+	Applies the lowpass filter to the complex mixed signal of mix_complex,
+	one complex FFT per block of channel_block channels, and returns
+	the magnitudes (np.abs) and phases (np.angle) for each channel, see
+	apply_lowpass. If mixed_phaseShift is given, mixed is real and the
+	complex signal of each block is mixed + i mixed_phaseShift.
 	"""
-	if pbar:
-		print("Applying Lowpass on each Channel", flush = True)
+	observer = get_observer(pbar)
 
 	timeSteps = len(time)
 	totalTime = time[timeSteps - 1] - time[0]
@@ -152,19 +464,441 @@ def apply_lowpass(mixed, mixed_phaseShift, time, cutoff, pbar):
 
 	r = []
 	theta = []
-	for i in trange(num_channels, position= 0, leave = True, disable = not pbar):
-		data = mixed[:,i]
-		data_phaseShift = mixed_phaseShift[:,i]
-		filteredColumn = fft_lowpass(data, cutoff, sample_rate, timeSteps)
-		filteredColumn_phaseShift = fft_lowpass(data_phaseShift, cutoff, sample_rate, timeSteps)
-		values = np.sqrt(np.power(np.absolute(filteredColumn), 2) + np.power(np.absolute(filteredColumn_phaseShift), 2))
-		angles = np.arctan2(filteredColumn_phaseShift, filteredColumn)
-		angle = np.mean(angles)
-		value = np.mean(values)
-		r.append(value)
-		theta.append(angle)
+	observer.started('lowpass', num_channels)
+	for i in range(0, num_channels, channel_block):
+		data = mixed[:, i : i + channel_block]
+		if mixed_phaseShift is not None:
+			data = data + 1j * mixed_phaseShift[:, i : i + channel_block]
+		#Magnitudes are summed over any zero-padding too, since with a low cutoff
+		#the filtered signal is spread over the padded length.
+		filtered = complex_lowpass(data, cutoff, sample_rate, backend)
+		with stage('reduce', filtered = filtered):
+			r.extend(np.sum(np.abs(filtered), axis = 0)/timeSteps)
+			theta.extend(np.mean(np.angle(filtered[:timeSteps]), axis = 0))
+		observer.progress('lowpass', min(i + channel_block, num_channels), num_channels)
+	observer.finished('lowpass')
 	return r, theta
 
+def apply_lowpass_traces(mixed, mixed_phaseShift, time, cutoff, output_rate, pbar):
+	"""
+	Applies the lowpass filter to the mixed signals one channel at a time
+	and keeps the lock-in values over time, decimated to the output rate.
+	The full rate filtered signal only ever exists for a single channel.
+	Parameters
+	----------
+	mixed : 2D array of floats
+		signal multiplied by reference signal.
+		Each row is a set of mixed values for each channel.
+	mixed_phaseShift : 2D array of floats or None
+		signal multiplied by phase shifted reference signal. If None,
+		only magnitudes are computed (no fit lock-in).
+	time : 1D array of floats
+		Timestamps for each signal measurement.
+	cutoff : float
+		Cutoff frequency for lowpass filter.
+	output_rate : float or None
+		Sampling rate of the output traces. Defaults to twice the cutoff,
+		a cutoff of 0 gives a single output sample. 
+	Returns
+	-------
+	trace_time : 1D array of floats
+		Timestamps for the output traces (centers of the decimation blocks).
+	r : 2D array of floats
+		Magnitude traces, each row is an output timestamp.
+	theta : 2D array of floats or None
+		Phase traces, same formatting as r.
+	"""
+	observer = get_observer(pbar)
+
+	timeSteps = len(time)
+	totalTime = time[timeSteps - 1] - time[0]
+	timePerSample = totalTime/timeSteps
+
+	sample_rate = 1/timePerSample
+	num_channels = len(mixed[0])
+
+	if output_rate is None:
+		output_rate = 2 * cutoff
+	if output_rate > 0:
+		step = min(max(1, int(sample_rate/output_rate)), timeSteps)
+	else:
+		step = timeSteps
+	num_out = timeSteps//step
+	used = num_out * step
+	trace_time = np.mean(np.reshape(time[:used], (num_out, step)), axis = 1)
+
+	r = np.zeros((num_out, num_channels))
+	theta = None
+	if mixed_phaseShift is not None:
+		theta = np.zeros((num_out, num_channels))
+	observer.started('lowpass', num_channels)
+	for i in range(num_channels):
+		#Block averaging is itself a lowpass, so I and Q are decimated before
+		#being converted to polar coordinates.
+		filteredColumn = fft_lowpass(mixed[:,i], cutoff, sample_rate, timeSteps)
+		filteredColumn = np.mean(np.reshape(filteredColumn[:used], (num_out, step)), axis = 1)
+		if mixed_phaseShift is None:
+			r[:, i] = np.absolute(filteredColumn)
+		else:
+			filteredColumn_phaseShift = fft_lowpass(mixed_phaseShift[:,i], cutoff, sample_rate, timeSteps)
+			filteredColumn_phaseShift = np.mean(np.reshape(filteredColumn_phaseShift[:used], (num_out, step)), axis = 1)
+			r[:, i] = np.hypot(filteredColumn, filteredColumn_phaseShift)
+			theta[:, i] = np.arctan2(filteredColumn_phaseShift, filteredColumn)
+		observer.progress('lowpass', i + 1, num_channels)
+	observer.finished('lowpass')
+	return trace_time, r, theta
+
+def rc_sos(time_constant, slope, f_s):
+	"""
+	Returns second-order sections for a cascade of identical RC lowpass
+	filters, like the output filter of a hardware lock-in amplifier.
+	Parameters
+	----------
+	time_constant : float
+		Time constant of each RC stage in seconds.
+	slope : int
+		Roll-off of the filter in dB/octave, one of 6, 12, 18 or 24.
+	f_s : float
+		Sampling frequency of the filtered signal.
+	"""
+	if slope not in (6, 12, 18, 24):
+		raise ValueError("slope must be 6, 12, 18 or 24 dB/oct, not " + str(slope))
+	decay = np.exp(-1/(f_s * time_constant))
+	section = [1 - decay, 0, 0, 1, -decay, 0]
+	return np.array([section] * (slope//6))
+
+
+def iir_lowpass(data, sos, zi = None):
+	"""
+	Lowpass filters data along the first axis with second-order sections.
+	All channels are filtered at once. Passing the final state of one call
+	as zi to the next filters a long record in chunks.
+	Parameters
+	----------
+	data : 2D array of floats
+		Signal data over time, each row is a timestamp.
+	sos : 2D array of floats
+		Second-order sections, see rc_sos.
+	zi : 3D array of floats
+		Initial filter state, zero if None.
+	Returns
+	-------
+	filtered_signal : 2D array of floats
+		Signal after being filtered. 
+	zf : 3D array of floats
+		Final filter state.
+	"""
+	if zi is None:
+		zi = np.zeros((sos.shape[0], 2) + data.shape[1:])
+	return scipy.signal.sosfilt(sos, data, axis = 0, zi = zi)
+
+
+def apply_lowpass_iir(mixed, mixed_phaseShift, time, time_constant, slope, pbar):
+	"""
+	Applies a cascaded RC lowpass filter to the mixed signals to get the
+	lock-in values for each channel, see apply_lowpass. Unlike the FFT
+	lowpass, the filter is causal and runs on all channels at once.
+	Parameters
+	----------
+	mixed : 2D array of floats
+		signal multiplied by reference signal.
+		Each row is a set of mixed values for each channel.
+	mixed_phaseShift : 2D array of floats or None
+		signal multiplied by phase shifted reference signal. If None,
+		only magnitudes are computed (no fit lock-in).
+	time : 1D array of floats
+		Timestamps for each signal measurement.
+	time_constant : float
+		Time constant of each RC stage in seconds.
+	slope : int
+		Roll-off of the filter in dB/octave.
+	"""
+	observer = get_observer(pbar)
+	observer.started('iir lowpass')
+
+	timeSteps = len(time)
+	totalTime = time[timeSteps - 1] - time[0]
+	sample_rate = timeSteps/totalTime
+	sos = rc_sos(time_constant, slope, sample_rate)
+
+	#The factor of 2 matches the gain of the FFT lowpass.
+	filtered, _ = iir_lowpass(mixed, sos)
+	filtered *= 2
+	if mixed_phaseShift is None:
+		observer.finished('iir lowpass')
+		return np.mean(np.absolute(filtered), axis = 0), None
+	filtered_phaseShift, _ = iir_lowpass(mixed_phaseShift, sos)
+	filtered_phaseShift *= 2
+	r = np.mean(np.hypot(filtered, filtered_phaseShift), axis = 0)
+	theta = np.mean(np.arctan2(filtered_phaseShift, filtered), axis = 0)
+	observer.finished('iir lowpass')
+	return r, theta
+
+
+def fir_kernel(cutoff, f_s, numtaps = None):
+	"""
+	Returns a linear phase FIR lowpass kernel with the given cutoff
+	frequency for data sampled at f_s. By default, the number of taps
+	gives a transition band about as wide as the cutoff frequency. 
+	"""
+	if cutoff <= 0:
+		raise ValueError("The FIR lowpass needs a positive cutoff")
+	if numtaps is None:
+		numtaps = int(4 * f_s/cutoff) | 1
+	return scipy.signal.firwin(numtaps, cutoff, fs = f_s)
+
+
+def overlap_save(data, kernel, nfft):
+	"""
+	Convolves data with kernel along the first axis by the overlap-save
+	method and yields the output in blocks. The output is aligned with
+	the input (centered kernel) and has the same length. Only one block
+	of nfft rows is transformed at a time, for all channels at once.
+	Parameters
+	----------
+	data : 2D array of floats
+		Signal data over time, each row is a timestamp.
+	kernel : 1D array of floats
+		FIR filter kernel, must be shorter than nfft.
+	nfft : int
+		FFT size of each block.
+	"""
+	numtaps = len(kernel)
+	if numtaps > nfft:
+		raise ValueError("nfft must be at least the number of taps")
+	step = nfft - numtaps + 1
+	delay = (numtaps - 1)//2
+	num_samples = len(data)
+	kernel_fourier = rfft(kernel, nfft).reshape((-1,) + (1,) * (data.ndim - 1))
+	for out_start in range(0, num_samples, step):
+		out_end = min(out_start + step, num_samples)
+		#Input samples that contribute to this block of outputs.
+		seg_start = out_start + delay - numtaps + 1
+		segment = np.zeros((nfft,) + data.shape[1:])
+		lo = max(seg_start, 0)
+		hi = min(seg_start + nfft, num_samples)
+		if hi > lo:
+			segment[lo - seg_start : hi - seg_start] = data[lo:hi]
+		filtered = irfft(rfft(segment, axis = 0) * kernel_fourier, nfft, axis = 0)
+		yield filtered[numtaps - 1 : numtaps - 1 + out_end - out_start]
+
+
+def apply_lowpass_fir(mixed, mixed_phaseShift, time, cutoff, numtaps, nfft, pbar):
+	"""
+	Applies an FIR lowpass filter to the mixed signals block by block
+	to get the lock-in values for each channel, see apply_lowpass. The
+	filtered signal is reduced as it is produced, so memory scales with
+	the block size rather than the length of the record.
+	Parameters
+	----------
+	mixed : 2D array of floats
+		signal multiplied by reference signal.
+		Each row is a set of mixed values for each channel.
+	mixed_phaseShift : 2D array of floats or None
+		signal multiplied by phase shifted reference signal. If None,
+		only magnitudes are computed (no fit lock-in).
+	time : 1D array of floats
+		Timestamps for each signal measurement.
+	cutoff : float
+		Cutoff frequency for lowpass filter.
+	numtaps : int or None
+		Number of taps of the filter kernel, see fir_kernel.
+	nfft : int
+		FFT size of each block. Raised to the next power of two
+		above twice the number of taps if needed.
+	"""
+	observer = get_observer(pbar)
+	observer.started('fir lowpass')
+
+	timeSteps = len(time)
+	totalTime = time[timeSteps - 1] - time[0]
+	sample_rate = timeSteps/totalTime
+	kernel = fir_kernel(cutoff, sample_rate, numtaps)
+	nfft = max(nfft, 2**int(np.ceil(np.log2(2 * len(kernel)))))
+
+	num_channels = mixed.shape[1]
+	r = np.zeros(num_channels)
+	if mixed_phaseShift is None:
+		for filtered in overlap_save(mixed, kernel, nfft):
+			#The factor of 2 matches the gain of the FFT lowpass.
+			r += np.sum(np.absolute(2 * filtered), axis = 0)
+		observer.finished('fir lowpass')
+		return r/timeSteps, None
+	theta = np.zeros(num_channels)
+	for filtered, filtered_phaseShift in zip(overlap_save(mixed, kernel, nfft),
+	 overlap_save(mixed_phaseShift, kernel, nfft)):
+		r += np.sum(np.hypot(2 * filtered, 2 * filtered_phaseShift), axis = 0)
+		theta += np.sum(np.arctan2(filtered_phaseShift, filtered), axis = 0)
+	observer.finished('fir lowpass')
+	return r/timeSteps, theta/timeSteps
+
+
+def iir_time_constant(self):
+	"""
+	Returns the time constant of the IIR lowpass, the amplifier's 
+	time_constant or 1/(2 pi cutoff) by default.
+	"""
+	if self.time_constant is not None:
+		return self.time_constant
+	if self.cutoff <= 0:
+		raise ValueError("The IIR lowpass needs a time constant or a positive cutoff")
+	return 1/(2 * np.pi * self.cutoff)
+
+
+def filter_mixed(self, mixed, mixed_phaseShift, time):
+	"""
+	Applies the lowpass filter engine selected on the amplifier 
+	(self.lowpass) to the mixed signals and returns the magnitudes
+	and phases for each channel. mixed_phaseShift and the returned
+	phases are None for the no fit lock-in.
+	"""
+	if self.lowpass == 'fft':
+		if np.iscomplexobj(mixed):
+			return apply_lowpass_complex(mixed, time, self.cutoff, self.pbar,
+			 self.fft_backend, self.channel_block)
+		if mixed_phaseShift is None:
+			return apply_lowpass_no_fit(mixed, time, self.cutoff, self.pbar,
+			 self.fft_backend, self.channel_block), None
+		return apply_lowpass(mixed, mixed_phaseShift, time, self.cutoff, self.pbar,
+		 self.fft_backend, self.channel_block)
+	elif self.lowpass == 'iir':
+		time_constant = iir_time_constant(self)
+		with stage('iir lowpass', mixed = mixed):
+			return apply_lowpass_iir(mixed, mixed_phaseShift, time, time_constant, self.slope, self.pbar)
+	elif self.lowpass == 'fir':
+		with stage('fir lowpass', mixed = mixed):
+			return apply_lowpass_fir(mixed, mixed_phaseShift, time, self.cutoff, self.fir_taps,
+			 self.block_size, self.pbar)
+	raise ValueError("Unknown lowpass engine: " + str(self.lowpass))
+
+
+def fused_applies(self):
+	"""
+	Returns whether the output is the mean of the mixed signal, so
+	mixing and the lowpass can be fused into one kernel (see kernels.py).
+	This is the case for the FFT lowpass with a cutoff of 0.
+	"""
+	return self.lowpass == 'fft' and self.cutoff == 0 and self.prefilter is None
+
+
+def fused_demodulate(self, kernel, signal, time, est_freq, est_phase):
+	"""
+	Returns the magnitudes and phases for each channel with a cutoff of
+	0 from the sums of the mixed signals computed by a fused kernel.
+	"""
+	observer = get_observer(self.pbar)
+	observer.started('mix')
+	with stage('fused', signal = signal):
+		sums = kernel(signal, np.asarray(time, dtype = np.float64), est_freq, est_phase,
+		 get_window(self.window, len(signal)), int(self.channel_block))
+	observer.finished('mix')
+	#The cutoff 0 lowpass doubles the mean of the mixed signal.
+	in_phase, quadrature = 2 * sums/len(signal)
+	return np.hypot(in_phase, quadrature), np.arctan2(quadrature, in_phase)
+
+
+def demodulate(self, signal, time, est_freq, est_phase, interpolate):
+	"""
+	Mixes the signal with the fitted reference signal, optionally 
+	decimates it and applies the lowpass filter, returning the magnitudes
+	and phases for each channel. If the amplifier has more than one
+	worker, the channels are split between worker processes.
+	"""
+	if self.workers is not None and self.workers > 1:
+		from .parallel import parallel_demodulate
+		if interpolate:
+			even_time = even_timesteps(time)
+			signal = resample(signal, time, even_time)
+			time = even_time
+		references = np.transpose(reference_values(time, est_freq, est_phase))
+		with stage('parallel demodulate', signal = signal):
+			return parallel_demodulate(self, signal, time, references)
+	kernel = get_kernel(self.engine) if fused_applies(self) else None
+	if kernel is not None:
+		if interpolate:
+			even_time = even_timesteps(time)
+			signal = resample(signal, time, even_time)
+			time = even_time
+		return fused_demodulate(self, kernel, signal, time, est_freq, est_phase)
+	if self.lowpass == 'fft' and self.prefilter is None:
+		#The FFT lowpass filters the mixed signals as one complex array
+		mixed, even_time = mix_complex(signal, time, est_freq, est_phase, interpolate,
+		 self.pbar, self.window)
+		return filter_mixed(self, mixed, None, even_time)
+	mixed, mixed_phaseShift, even_time = mix(signal, time, est_freq, est_phase, interpolate,
+	 self.pbar, self.window)
+	if self.prefilter is not None:
+		with stage('decimate', mixed = mixed):
+			mixed, mixed_phaseShift, even_time = decimate_mixed(mixed, mixed_phaseShift, even_time,
+			 self.cutoff, self.prefilter)
+	return filter_mixed(self, mixed, mixed_phaseShift, even_time)
+
+
+def demodulate_no_fit(self, signal, sig_time, reference, ref_time, interpolate):
+	"""
+	Mixes the signal with the measured reference signal, optionally
+	decimates it and applies the lowpass filter, returning the magnitudes
+	for each channel. See demodulate.
+	"""
+	if self.workers is not None and self.workers > 1:
+		from .parallel import parallel_demodulate
+		if interpolate:
+			even_time = even_timesteps(sig_time)
+			signal = resample(signal, sig_time, even_time)
+			reference = resample(reference, ref_time, even_time)
+			sig_time = even_time
+		with stage('parallel demodulate', signal = signal):
+			magnitudes, _ = parallel_demodulate(self, signal, sig_time, np.transpose([reference]))
+		return magnitudes
+	mixed, even_time = mix_no_fit(signal, sig_time, reference, ref_time, interpolate,
+	 self.pbar, self.window)
+	if self.prefilter is not None:
+		with stage('decimate', mixed = mixed):
+			mixed, even_time = decimate(mixed, even_time, self.cutoff, self.prefilter)
+	magnitudes, _ = filter_mixed(self, mixed, None, even_time)
+	return magnitudes
+
+
+def lock_in_spectra(self, signal, time, est_freq, est_phase, window_size, interpolate):
+	"""
+	Mixes the first window_size of the signal with the fitted reference 
+	signal (decimating if the amplifier has a prefilter) and returns 
+	the spectra of the mixed signals, see mixed_spectra.
+	"""
+	if self.lowpass != 'fft':
+		raise ValueError("Spectra can only be kept for the 'fft' lowpass")
+	indices = split(len(signal), 1, window_size)
+	signal = signal[indices[0][0]:indices[0][1]]
+	time = time[indices[0][0]:indices[0][1]]
+	mixed, mixed_phaseShift, even_time = mix(signal, time, est_freq, est_phase, interpolate,
+	 self.pbar, self.window)
+	if self.prefilter is not None:
+		with stage('decimate', mixed = mixed):
+			mixed, mixed_phaseShift, even_time = decimate_mixed(mixed, mixed_phaseShift, even_time,
+			 self.cutoff, self.prefilter)
+	return mixed_spectra(self, mixed, mixed_phaseShift, even_time)
+
+
+def lock_in_no_fit_spectra(self, signal, sig_time, reference, ref_time, window_size, interpolate):
+	"""
+	Mixes the first window_size of the signal with the measured reference
+	signal and returns the spectrum of the mixed signal, see lock_in_spectra.
+	"""
+	if self.lowpass != 'fft':
+		raise ValueError("Spectra can only be kept for the 'fft' lowpass")
+	indices = split(len(signal), 1, window_size)
+	signal = signal[indices[0][0]:indices[0][1]]
+	sig_time = sig_time[indices[0][0]:indices[0][1]]
+	reference = reference[indices[0][0]:indices[0][1]]
+	ref_time = ref_time[indices[0][0]:indices[0][1]]
+	mixed, even_time = mix_no_fit(signal, sig_time, reference, ref_time, interpolate,
+	 self.pbar, self.window)
+	if self.prefilter is not None:
+		with stage('decimate', mixed = mixed):
+			mixed, even_time = decimate(mixed, even_time, self.cutoff, self.prefilter)
+	return mixed_spectra(self, mixed, None, even_time)
+
+
 def split(sample_len, num_windows, window_prop):  
 	"""
 	Returns a list of approximate indices to split an array into 
@@ -201,7 +935,109 @@ def split(sample_len, num_windows, window_prop):
 
 	return indices
 
-def lock_in(self, signal, time, est_freq, est_phase, num_windows, window_size, interpolate):
+def prefix_sum_applies(self, interpolate):
+	"""
+	Returns whether the lock-in output of every window is a difference
+	of cumulative sums of the mixed signal. This is the case for a
+	rectangular window with a cutoff of 0 and no interpolation.
+	"""
+	return (self.window == 'rectangular' and self.cutoff == 0 and self.lowpass == 'fft'
+	 and self.prefilter is None and not interpolate)
+
+
+def prefix_sum_windows(signal, references, indices):
+	"""
+	Computes the lock-in output of many windows at once, for a rectangular
+	window and a cutoff of 0, from cumulative sums of the signal times
+	each reference. Each window costs one subtraction, so all the windows
+	(overlapping, or sliding by one sample) cost O(n) in total.
+	Parameters
+	----------
+	signal : 2D array of floats
+		Intensity values for each channel over time.
+	references : list of 1D arrays of floats
+		Reference values over time, the fitted reference and its pi/2
+		phase shift, or a single measured reference.
+	indices : list of tuples
+		(start, end) of each window, see split.
+	Returns
+	-------
+	magnitudes : 2D array of floats
+		Lock-in magnitudes, one row per window
+	phases : 2D array of floats or None
+		Lock-in phases, one row per window, None for a single reference.
+	"""
+	starts = np.array([index[0] for index in indices])
+	ends = np.array([index[1] for index in indices])
+	lengths = (ends - starts).reshape((-1, 1))
+	#The lowpass filter doubles the DC level of the mixed signal.
+	means = []
+	for reference in references:
+		summed = np.zeros((len(signal) + 1, signal.shape[1]))
+		np.cumsum(signal * np.reshape(reference, (-1, 1)), axis = 0, out = summed[1:])
+		means.append(2 * (summed[ends] - summed[starts])/lengths)
+	if len(means) == 1:
+		return np.absolute(means[0]), None
+	return np.hypot(means[0], means[1]), np.arctan2(means[1], means[0])
+
+
+class window_executor:
+	"""
+	Context manager giving the executor used to process windows in
+	parallel. This is the amplifier's window_executor if it has one
+	(left open on exit), otherwise a thread pool with window_workers
+	threads that is shut down on exit. Threads work well since the 
+	NumPy FFT and array operations release the GIL.
+	"""
+	def __init__(self, amp):
+		self.executor = amp.window_executor
+		self.owned = self.executor is None
+		if self.owned:
+			self.executor = ThreadPoolExecutor(max_workers = amp.window_workers)
+
+	def __enter__(self):
+		return self.executor
+
+	def __exit__(self, *args):
+		if self.owned:
+			self.executor.shutdown()
+
+
+def window_batches(self, num_windows, adaptive, min_windows = 3):
+	"""
+	Yields batches of window numbers to process. Normally all windows
+	are processed in one batch. When adaptive, the windows are visited 
+	in bit-reversed (van der Corput) order so that every prefix covers 
+	the whole record evenly, first min_windows of them and then one 
+	window per parallel worker at a time.
+	"""
+	if not adaptive:
+		yield list(range(num_windows))
+		return
+	bits = max(1, int(np.ceil(np.log2(num_windows))))
+	order = [int(format(k, '0' + str(bits) + 'b')[::-1], 2) for k in range(2**bits)]
+	order = [k for k in order if k < num_windows]
+	batch_size = self.window_workers or os.cpu_count() or 1
+	yield order[:min_windows]
+	for start in range(min_windows, num_windows, batch_size):
+		yield order[start : start + batch_size]
+
+
+def converged(mag_stats, target_error, error_fraction):
+	"""
+	Returns whether the relative standard error of the mean magnitude
+	is below target_error for at least error_fraction of the channels.
+	"""
+	if mag_stats.count < 2:
+		return False
+	std_error = mag_stats.std()/np.sqrt(mag_stats.count)
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		relative = std_error/np.absolute(mag_stats.mean)
+	return np.mean(relative < target_error) >= error_fraction
+
+
+def lock_in(self, signal, time, est_freq, est_phase, num_windows, window_size, interpolate,
+ target_error = None, error_fraction = 0.95):
 
 	"""
 	Applies lock-in to the data by performing the signal mixing and 
@@ -225,6 +1061,12 @@ def lock_in(self, signal, time, est_freq, est_phase, num_windows, window_size, i
 	window_size : float
 		Value between 0 and 1, the size of each window as a 
 		percentage of total input size.
+	target_error : float or None
+		If given, windows are processed until the relative standard
+		error of the magnitude is below target_error for error_fraction
+		of the channels, with num_windows as the maximum. See window_batches.
+	error_fraction : float
+		Fraction of channels that must reach target_error.
 
 	Returns
 	-------
@@ -237,46 +1079,254 @@ def lock_in(self, signal, time, est_freq, est_phase, num_windows, window_size, i
 	phase_errors : 1D array of floats
 		Standard deviation for each Lock-in phase output
 	indices : 1D array of tuples
-		List of indices for the window splitting
+		List of indices for the windows that were used
 	"""
 	cutoff = self.cutoff
 	pbar = self.pbar
+	if prefix_sum_applies(self, interpolate):
+		indices = split(len(signal), num_windows, window_size)
+		with stage('prefix sum', signal = signal):
+			mags, phases = prefix_sum_windows(signal, list(reference_values(time, est_freq, est_phase)),
+			 indices)
+		if num_windows == 1:
+			return mags[0], phases[0], 0, 0, indices
+		mag_stats = RunningStats().update_many(mags)
+		phase_stats = CircularStats().update_many(phases)
+		return mag_stats.mean, phase_stats.mean, mag_stats.std(), phase_stats.std(), indices
 	if num_windows == 1:
 		#Splitting here in case user wanted to throw away some of the data
 		indices = split(len(signal), num_windows, window_size)
 		signal = signal[indices[0][0]:indices[0][1]]
 		time = time[indices[0][0]:indices[0][1]]
-		#mixing the signal
-		mixed, mixed_phaseShift, even_time = mix(signal, time, est_freq, est_phase, interpolate, pbar)
-		#Applying the lowpass filter
-		magnitudes, phases = apply_lowpass(mixed, mixed_phaseShift, even_time, cutoff, pbar)
+		#mixing the signal and applying the lowpass filter
+		magnitudes, phases = demodulate(self, signal, time, est_freq, est_phase, interpolate)
 		return magnitudes, phases, 0, 0, indices
 	
-	print("Splitting Input...", flush = True)
+	observer = get_observer(pbar)
 	indices = split(len(signal), num_windows, window_size)
-	mags_list = []
-	phases_list = []
-	for index in indices:
-		tmpSig = signal[index[0] : index[1]]
-		tmpTime = time[index[0] : index[1]]
-		#Mixes the intensity signal with the normal and phase shifted reference signals.
-		mixed, mixed_phaseShift, even_time = mix(tmpSig, tmpTime, est_freq, est_phase, interpolate, pbar)
-		#Applies lowpass filter
-		tmpMags, tmpPhases  = apply_lowpass(mixed, mixed_phaseShift, even_time, cutoff, pbar)
-		mags_list.append(np.asarray(tmpMags))
-		phases_list.append(np.asarray(tmpPhases))
-
-	magnitudes, var_mags = sp.describe(mags_list)[2:4]
-	mag_errors = np.sqrt(var_mags)
-	phases, var_phases = sp.describe(phases_list)[2:4]
-	phase_errors = np.sqrt(var_phases)
+	observer.started('windows', len(indices))
+	mag_stats = RunningStats()
+	phase_stats = CircularStats()
+	used = []
+	with window_executor(self) as executor:
+		for batch in window_batches(self, len(indices), target_error is not None):
+			#Mixes the intensity signal with the normal and phase shifted reference signals
+			#and applies the lowpass filter, for each window in parallel.
+			futures = [executor.submit(bind(demodulate, executor), self, signal[indices[k][0] : indices[k][1]],
+			 time[indices[k][0] : indices[k][1]], est_freq, est_phase, interpolate) for k in batch]
+			while futures:
+				tmpMags, tmpPhases = futures.pop(0).result()
+				mag_stats.update(tmpMags)
+				phase_stats.update(tmpPhases)
+				observer.progress('windows', mag_stats.count, len(indices))
+			used.extend(batch)
+			if target_error is not None and converged(mag_stats, target_error, error_fraction):
+				break
+	observer.finished('windows')
+	indices = [indices[k] for k in sorted(used)]
+
+	magnitudes = mag_stats.mean
+	mag_errors = mag_stats.std()
+	phases = phase_stats.mean
+	phase_errors = phase_stats.std()
 
 	return magnitudes, phases, mag_errors, phase_errors, indices
 
 
 
+def dominant_frequency(reference, ref_time):
+	"""
+	Returns the frequency of the largest peak in the spectrum of a 
+	measured reference signal (excluding DC).
+	"""
+	reference = np.asarray(reference, dtype = float)
+	spectrum = np.absolute(rfft(reference - np.mean(reference)))
+	sample_rate = len(ref_time)/(ref_time[-1] - ref_time[0])
+	return np.argmax(spectrum[1:]) * sample_rate/len(reference) + sample_rate/len(reference)
+
+
+def screen_snr(signal, time, frequencies, num_samples = 4096, num_probes = 8, spacing = 4,
+ max_elements = 2**22):
+	"""
+	Coarse estimate of the signal-to-noise ratio of every channel at 
+	each of the frequencies. For each frequency, the signal is shifted
+	down to 0 Hz (multiplied by exp(-2 pi i f t)), decimated to about 
+	num_samples timestamps by averaging blocks of timestamps (a first
+	order CIC filter, see block_means), whose nulls at every alias of 
+	0 Hz keep noise at other frequencies from folding onto the probes,
+	and projected onto complex exponentials at 0 Hz and at num_probes
+	nearby frequencies, spaced by spacing frequency bins on either 
+	side, with one matrix product. The SNR is the amplitude at the 
+	frequency over the RMS amplitude at the probes, the noise floor.
+	Parameters
+	----------
+	signal : 2D array of floats
+		Intensity values for each channel over time.
+	time : 1D array of floats
+		Timestamps for the data.
+	frequencies : list of floats
+		Frequencies of the references.
+	max_elements : int
+		Channels are shifted and decimated a block at a time, so that
+		each block has at most about max_elements values.
+	Returns
+	-------
+	snr : 2D array of floats
+		SNR of each channel (columns) at each frequency (rows).
+	"""
+	time = np.asarray(time, dtype = np.float64)
+	num_blocks = min(num_samples, len(time))
+	t = block_means(time, num_blocks)
+	bin_width = 1/(t[-1] - t[0])
+	offsets = spacing * bin_width * np.arange(1, num_probes//2 + 1)
+	offsets = np.concatenate([[0], offsets, -offsets])
+	basis = np.exp(-2j * np.pi * np.outer(t, offsets))
+	num_channels = signal.shape[1]
+	block = max(1, max_elements//len(time))
+	snr = np.empty((len(frequencies), num_channels))
+	for j, frequency in enumerate(frequencies):
+		sin, cos = reference_values(time, frequency, 0)
+		shift = (cos - 1j * sin).reshape((-1, 1))
+		for i in range(0, num_channels, block):
+			data = np.asarray(signal[:, i : i + block], dtype = np.float64)
+			shifted = block_means((data - np.mean(data, axis = 0)) * shift, num_blocks)
+			amplitudes = np.abs(2 * (basis.T @ shifted)/len(t))
+			noise = np.sqrt(np.mean(amplitudes[1:]**2, axis = 0))
+			with np.errstate(divide = 'ignore', invalid = 'ignore'):
+				snr[j, i : i + block] = amplitudes[0]/noise
+	return snr
+
+
+def block_means(data, num_blocks):
+	"""
+	Returns the mean of data (along the first axis) in each of num_blocks
+	contiguous blocks of nearly equal size.
+	"""
+	bounds = np.linspace(0, len(data), num_blocks + 1).astype(int)
+	return np.add.reduceat(data, bounds[:-1], axis = 0)/np.diff(bounds).reshape((-1,) + (1,) * (data.ndim - 1))
+
+
+def resample_errors(means, window_size, method, num_resamples, rng, phases = True, chunk = 64):
+	"""
+	Estimates the standard deviation of the lock-in magnitude (and phase)
+	from a window of window_size of the data, by resampling the block
+	means of the mixed signal. 
+	Parameters
+	----------
+	means : 2D array of complex or floats
+		Block means of the mixed signals (in-phase + 1j * quadrature for
+		the fitted reference), one row per block.
+	window_size : float
+		Value between 0 and 1, the size of the windows whose spread is
+		estimated, as a proportion of the record.
+	method : string
+		'bootstrap' draws num_resamples sets of window_size * num_blocks
+		blocks with replacement. 'jackknife' leaves out one block at a 
+		time and scales the spread to the window size. 
+	rng : numpy.random.Generator
+		Random number generator for the bootstrap.
+	chunk : int
+		Number of resamples evaluated at once.
+	Returns
+	-------
+	mag_errors : 1D array of floats
+		Standard deviation of the magnitude for each channel
+	phase_errors : 1D array of floats or None
+		Standard deviation of the phase for each channel
+	"""
+	num_blocks = len(means)
+	window_blocks = max(1, int(round(window_size * num_blocks)))
+	mag_stats = RunningStats()
+	phase_stats = CircularStats()
+	if method == 'bootstrap':
+		for start in range(0, num_resamples, chunk):
+			size = min(chunk, num_resamples - start)
+			counts = rng.multinomial(window_blocks, np.ones(num_blocks)/num_blocks, size = size)
+			resampled = (counts @ means)/window_blocks
+			mag_stats.update_many(np.absolute(resampled))
+			if phases:
+				phase_stats.update_many(np.angle(resampled))
+		scale = 1
+	elif method == 'jackknife':
+		left_out = (np.sum(means, axis = 0) - means)/(num_blocks - 1)
+		mag_stats.update_many(np.absolute(left_out))
+		if phases:
+			phase_stats.update_many(np.angle(left_out))
+		#Jackknife standard error of the full record, scaled to the window size
+		scale = (num_blocks - 1)/np.sqrt(num_blocks) * np.sqrt(num_blocks/window_blocks)
+	else:
+		raise ValueError("Unknown error method: " + str(method))
+	if phases:
+		return scale * mag_stats.std(), scale * phase_stats.std()
+	return scale * mag_stats.std(), None
+
+
+def lock_in_resampled(self, signal, time, est_freq, est_phase, window_size, interpolate,
+ method, num_blocks, num_resamples, seed = None):
+	"""
+	Estimates errorbars for the lock-in by mixing the signal once, 
+	averaging it in num_blocks blocks and resampling the blocks (see
+	resample_errors) instead of demodulating each window separately. 
+	The block means correspond to a cutoff of 0 with a rectangular window.
+
+	Returns
+	-------
+	mag_errors : 1D array of floats
+		Standard deviation for each Lock-in magnitude output
+	phase_errors : 1D array of floats
+		Standard deviation for each Lock-in phase output
+	"""
+	mixed, mixed_phaseShift, _ = mix(signal, time, est_freq, est_phase, interpolate,
+	 self.pbar, window = 'rectangular')
+	#The lowpass filter doubles the mixed signal.
+	means = 2 * (block_means(mixed, num_blocks) + 1j * block_means(mixed_phaseShift, num_blocks))
+	return resample_errors(means, window_size, method, num_resamples, np.random.default_rng(seed))
+
+
+def lock_in_traces(self, signal, time, est_freq, est_phase, window_size, interpolate, output_rate):
+	"""
+	Applies lock-in to the data and returns the lock-in magnitude and phase
+	over time rather than their averages. The mixed signal is not windowed
+	so the traces are not tapered at the ends of the record. 
+
+	Parameters
+	----------
+	signal : 2D array of floats
+		Intensity values for each channel over time.
+	time : 1D array of floats
+		Timestamps for the data
+	est_freq : float
+		Estimated frequency of the reference signal.
+	est_phase : float
+		Estimated phase of the reference signal
+	window_size : float
+		Value between 0 and 1, the proportion of the input to use.
+	output_rate : float or None
+		Sampling rate of the output traces, see apply_lowpass_traces.
+
+	Returns
+	-------
+	trace_time : 1D array of floats
+		Timestamps of the output traces
+	magnitudes : 2D array of floats
+		Lock-in magnitude traces for each channel
+	phases : 2D array of floats
+		Lock-in phase traces for each channel
+	"""
+	cutoff = self.cutoff
+	pbar = self.pbar
+	indices = split(len(signal), 1, window_size)
+	signal = signal[indices[0][0]:indices[0][1]]
+	time = time[indices[0][0]:indices[0][1]]
+	mixed, mixed_phaseShift, even_time = mix(signal, time, est_freq, est_phase,
+	 interpolate, pbar, window = 'rectangular')
+	#The rectangular window halves the mixed signal which is doubled again by the lowpass.
+	return apply_lowpass_traces(mixed, mixed_phaseShift, even_time, cutoff, output_rate, pbar)
+
+
+
 # No fit functions
-def mix_no_fit(signal, sig_time, reference, ref_time, interpolate, pbar):
+def mix_no_fit(signal, sig_time, reference, ref_time, interpolate, pbar, window = 'hanning'):
 	"""
 	Performs the signal mixing step of a lock in amplifier.
 	Mixes, or multiplies, the intensity signal for all channels
@@ -295,6 +1345,8 @@ def mix_no_fit(signal, sig_time, reference, ref_time, interpolate, pbar):
 		Reference signal over time. 
 	ref_time : 1D array of floats
 		Timestamps for reference signal
+	window : string
+		Name of the window to apply, see get_window.
 	Returns
 	-------
 	mixed : 2D array of floats
@@ -302,31 +1354,26 @@ def mix_no_fit(signal, sig_time, reference, ref_time, interpolate, pbar):
 		Each row is a set of mixed values for each channel with a timestamp.
 	"""
 
-	if pbar:
-		print("Mixing...", flush = True)
+	observer = get_observer(pbar)
+	observer.started('mix')
 	if interpolate:
-		interpolated_sig = scipy.interpolate.interp1d(sig_time, signal, bounds_error=False,
-		 kind='linear', axis = 0, fill_value = "extrapolate")
-		interpolated_ref = scipy.interpolate.interp1d(ref_time, reference, bounds_error=False,
-		 kind='linear', axis = 0, fill_value = "extrapolate")
-		min_time = min(sig_time)
-		max_time = max(sig_time)
-		len_time = len(sig_time)
-		timestep = (max_time - min_time)/len_time
-		even_time = np.arange(min_time, max_time, timestep)
-		signal = interpolated_sig(even_time)
-		reference = interpolated_ref(even_time)
+		even_time = even_timesteps(sig_time)
+		signal = resample(signal, sig_time, even_time)
+		reference = resample(reference, ref_time, even_time)
 	num_rows = len(signal)
-	mixed = np.multiply(signal, np.array([reference]).T) * 2 #The 2 is a scaling factor.
+	with stage('mix', signal = signal):
+		mixed = np.multiply(signal, np.array([reference]).T) * 2 #The 2 is a scaling factor.
 
-	window = np.hanning(num_rows)
-	mixed = mixed * window.reshape((window.size, 1))
+	with stage('window', mixed = mixed):
+		window = get_window(window, num_rows)
+		mixed = mixed * window.reshape((window.size, 1))
+	observer.finished('mix')
 	if interpolate:
 		return mixed, even_time
 	else:
 		return mixed, sig_time
 
-def apply_lowpass_no_fit(mixed, time, cutoff, pbar):
+def apply_lowpass_no_fit(mixed, time, cutoff, pbar, backend = None, channel_block = 1):
 	"""
 	Applies lowpass filter to the mixed signal to get cartesian lock in values
 	for each measured channel.
@@ -339,9 +1386,12 @@ def apply_lowpass_no_fit(mixed, time, cutoff, pbar):
 		Timestamps for each signal measurement.
 	cutoff : float
 		Cutoff frequency for lowpass filter.
+	backend : FFT backend
+		Backend for the transforms, see fft_lowpass.
+	channel_block : int
+		Number of channels transformed together.
 	"""
-	if pbar:
-		print("Applying Lowpass on each Channel", flush = True)
+	observer = get_observer(pbar)
 
 	timeSteps = len(time)
 	totalTime = time[timeSteps - 1] - time[0]
@@ -351,16 +1401,19 @@ def apply_lowpass_no_fit(mixed, time, cutoff, pbar):
 	num_channels = len(mixed[0])
 
 	r = []
-	theta = []
-	for i in trange(num_channels, position= 0, leave = True, disable = not pbar):
-		data = mixed[:,i]
-		filteredColumn = fft_lowpass(data, cutoff, sample_rate, timeSteps)
-		values = np.absolute(filteredColumn)
-		value = np.mean(values)
-		r.append(value)
+	observer.started('lowpass', num_channels)
+	for i in range(0, num_channels, channel_block):
+		data = mixed[:, i : i + channel_block]
+		filteredColumn = fft_lowpass(data, cutoff, sample_rate, timeSteps, backend, crop = False)
+		with stage('reduce', filtered = filteredColumn):
+			values = np.absolute(filteredColumn)
+			r.extend(np.sum(values, axis = 0)/timeSteps)
+		observer.progress('lowpass', min(i + channel_block, num_channels), num_channels)
+	observer.finished('lowpass')
 	return r
 
-def lock_in_no_fit(self, signal, sig_time, reference, ref_time, num_windows, window_size, interpolate):
+def lock_in_no_fit(self, signal, sig_time, reference, ref_time, num_windows, window_size, interpolate,
+ target_error = None, error_fraction = 0.95):
 
 	"""
 	Applies lock-in to the data by performing the signal mixing and 
@@ -384,6 +1437,12 @@ def lock_in_no_fit(self, signal, sig_time, reference, ref_time, num_windows, win
 	window_size : float
 		Value between 0 and 1, the size of each window as a 
 		percentage of total input size.
+	target_error : float or None
+		If given, windows are processed until the relative standard
+		error of the magnitude is below target_error for error_fraction
+		of the channels, with num_windows as the maximum. See window_batches.
+	error_fraction : float
+		Fraction of channels that must reach target_error.
 
 	Returns
 	-------
@@ -392,10 +1451,18 @@ def lock_in_no_fit(self, signal, sig_time, reference, ref_time, num_windows, win
 	mag_errors : 1D array of floats
 		Standard deviation for each Lock-in magnitude output
 	indices : 1D array of tuples
-		List of indices for the window splitting
+		List of indices for the windows that were used
 	"""
 	cutoff = self.cutoff
 	pbar = self.pbar
+	if prefix_sum_applies(self, interpolate):
+		indices = split(len(signal), num_windows, window_size)
+		with stage('prefix sum', signal = signal):
+			mags, _ = prefix_sum_windows(signal, [reference], indices)
+		if num_windows == 1:
+			return mags[0], 0, indices
+		mag_stats = RunningStats().update_many(mags)
+		return mag_stats.mean, mag_stats.std(), indices
 	if num_windows == 1:
 		#Splitting here in case user wanted to throw away some of the data
 		indices = split(len(signal), num_windows, window_size)
@@ -403,28 +1470,76 @@ def lock_in_no_fit(self, signal, sig_time, reference, ref_time, num_windows, win
 		sig_time = sig_time[indices[0][0]:indices[0][1]]
 		reference = reference[indices[0][0]:indices[0][1]]
 		ref_time = ref_time[indices[0][0]:indices[0][1]]
-		#mixing the signal
-		mixed, even_time = mix_no_fit(signal, sig_time, reference, ref_time, interpolate, pbar)
-		#Applying the lowpass filter
-		magnitudes = apply_lowpass_no_fit(mixed, even_time, cutoff, pbar)
+		#mixing the signal and applying the lowpass filter
+		magnitudes = demodulate_no_fit(self, signal, sig_time, reference, ref_time, interpolate)
 		return magnitudes, 0, indices
 	
-	print("Splitting Input...", flush = True)
+	observer = get_observer(pbar)
 	indices = split(len(signal), num_windows, window_size)
-	mags_list = []
-	phases_list = []
-	for index in indices:
-		tmpSig = signal[index[0] : index[1]]
-		tmpTime = sig_time[index[0] : index[1]]
-		tmpRef = reference[index[0] : index[1]]
-		tmpRefTime = ref_time[index[0] : index[1]]
-		#Mixes the intensity signal with the normal and phase shifted reference signals.
-		mixed, even_time = mix_no_fit(tmpSig, tmpTime, tmpRef, tmpRefTime, interpolate, pbar)
-		#Applies lowpass filter
-		tmpMags = apply_lowpass_no_fit(mixed, even_time, cutoff, pbar)
-		mags_list.append(np.asarray(tmpMags))
-
-	magnitudes, var_mags = sp.describe(mags_list)[2:4]
-	mag_errors = np.sqrt(var_mags)
-
-	return magnitudes, mag_errors, indices
\ No newline at end of file
+	observer.started('windows', len(indices))
+	mag_stats = RunningStats()
+	used = []
+	with window_executor(self) as executor:
+		for batch in window_batches(self, len(indices), target_error is not None):
+			#Mixes the intensity signal with the reference signal and applies the lowpass filter,
+			#for each window in parallel.
+			futures = [executor.submit(bind(demodulate_no_fit, executor), self, signal[indices[k][0] : indices[k][1]],
+			 sig_time[indices[k][0] : indices[k][1]], reference[indices[k][0] : indices[k][1]],
+			  ref_time[indices[k][0] : indices[k][1]], interpolate) for k in batch]
+			while futures:
+				mag_stats.update(futures.pop(0).result())
+				observer.progress('windows', mag_stats.count, len(indices))
+			used.extend(batch)
+			if target_error is not None and converged(mag_stats, target_error, error_fraction):
+				break
+	observer.finished('windows')
+	indices = [indices[k] for k in sorted(used)]
+
+	magnitudes = mag_stats.mean
+	mag_errors = mag_stats.std()
+
+	return magnitudes, mag_errors, indices
+
+def lock_in_no_fit_traces(self, signal, sig_time, reference, ref_time, window_size, interpolate, output_rate):
+	"""
+	Applies lock-in to the data and returns the lock-in magnitude
+	over time, see lock_in_traces. 
+
+	Returns
+	-------
+	trace_time : 1D array of floats
+		Timestamps of the output traces
+	magnitudes : 2D array of floats
+		Lock-in magnitude traces for each channel
+	"""
+	cutoff = self.cutoff
+	pbar = self.pbar
+	indices = split(len(signal), 1, window_size)
+	signal = signal[indices[0][0]:indices[0][1]]
+	sig_time = sig_time[indices[0][0]:indices[0][1]]
+	reference = reference[indices[0][0]:indices[0][1]]
+	ref_time = ref_time[indices[0][0]:indices[0][1]]
+	mixed, even_time = mix_no_fit(signal, sig_time, reference, ref_time, interpolate, pbar,
+	 window = 'rectangular')
+	trace_time, magnitudes, _ = apply_lowpass_traces(mixed, None, even_time, cutoff, output_rate, pbar)
+	return trace_time, magnitudes
+
+
+
+def lock_in_no_fit_resampled(self, signal, sig_time, reference, ref_time, window_size, interpolate,
+ method, num_blocks, num_resamples, seed = None):
+	"""
+	Estimates magnitude errorbars for the no fit lock-in by resampling 
+	block means of the mixed signal, see lock_in_resampled.
+
+	Returns
+	-------
+	mag_errors : 1D array of floats
+		Standard deviation for each Lock-in magnitude output
+	"""
+	mixed, _ = mix_no_fit(signal, sig_time, reference, ref_time, interpolate,
+	 self.pbar, window = 'rectangular')
+	means = 2 * block_means(mixed, num_blocks)
+	mag_errors, _ = resample_errors(means, window_size, method, num_resamples,
+	 np.random.default_rng(seed), phases = False)
+	return mag_errors
@@ -0,0 +1,149 @@
+import contextlib
+import contextvars
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+
+#The recorder of the lock-in running in this context, if any.
+_recorder = contextvars.ContextVar('silia_recorder', default = None)
+
+
+class Recorder:
+	"""
+	Records the wall time, CPU time, memory allocated and array shapes
+	of each stage of a lock-in run inside the recorder's context:
+
+		with Recorder() as recorder:
+			out = amplifier.amplify(references, signal_input)
+		recorder.to_chrome_trace('trace.json')
+
+	Memory is traced with tracemalloc, which is started for the duration
+	of the context if it is not already running. The allocated bytes of
+	a stage are the peak traced memory during the stage above the traced
+	memory at its start; stages running at the same time on different
+	threads count each other's allocations. CPU time is that of the
+	thread running the stage. Stages run in worker processes (see
+	parallel.py) are not recorded separately.
+	"""
+	def __init__(self):
+		self.records = []
+		self.lock = threading.Lock()
+		self.local = threading.local()
+		self.origin = time.perf_counter()
+		self.started_tracing = False
+		self.token = None
+
+	def __enter__(self):
+		if not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self.started_tracing = True
+		self.origin = time.perf_counter()
+		self.token = _recorder.set(self)
+		return self
+
+	def __exit__(self, *args):
+		_recorder.reset(self.token)
+		if self.started_tracing:
+			tracemalloc.stop()
+			self.started_tracing = False
+
+	def stack(self):
+		"""
+		Returns the peak memory of the children of each open stage on
+		this thread.
+		"""
+		if not hasattr(self.local, 'stack'):
+			self.local.stack = []
+		return self.local.stack
+
+	def add(self, record):
+		with self.lock:
+			self.records.append(record)
+
+	def totals(self):
+		"""
+		Returns the total wall time, CPU time and number of calls for each
+		stage, summing over all calls.
+		"""
+		totals = {}
+		for record in self.records:
+			total = totals.setdefault(record['stage'], {'wall time' : 0., 'cpu time' : 0., 'calls' : 0})
+			total['wall time'] += record['wall time']
+			total['cpu time'] += record['cpu time']
+			total['calls'] += 1
+		return totals
+
+	def to_jsonl(self, path):
+		"""
+		Writes the records to path as JSON lines, one stage call per line.
+		"""
+		with open(path, 'w') as f:
+			for record in self.records:
+				f.write(json.dumps(record) + '\n')
+
+	def to_chrome_trace(self, path):
+		"""
+		Writes the records to path in the Chrome trace event format, which
+		can be opened in chrome://tracing or Perfetto.
+		"""
+		events = []
+		for record in self.records:
+			events.append({'name' : record['stage'], 'ph' : 'X', 'pid' : 0,
+			 'tid' : record['thread'], 'ts' : record['start'] * 1e6, 'dur' : record['wall time'] * 1e6,
+			  'args' : {'cpu time' : record['cpu time'], 'allocated bytes' : record['allocated bytes'],
+			   'shapes' : record['shapes']}})
+		with open(path, 'w') as f:
+			json.dump({'traceEvents' : events, 'displayTimeUnit' : 'ms'}, f)
+
+
+def current_recorder():
+	"""
+	Returns the recorder of the current context, or None.
+	"""
+	return _recorder.get()
+
+
+@contextlib.contextmanager
+def stage(name, **arrays):
+	"""
+	Context manager recording a stage of the lock-in with the shapes of
+	the given arrays, if a Recorder is active. Otherwise does nothing.
+	"""
+	recorder = _recorder.get()
+	if recorder is None:
+		yield
+		return
+	stack = recorder.stack()
+	start_memory = tracemalloc.get_traced_memory()[0]
+	tracemalloc.reset_peak()
+	stack.append(start_memory)
+	start = time.perf_counter()
+	start_cpu = time.thread_time()
+	try:
+		yield
+	finally:
+		wall_time = time.perf_counter() - start
+		cpu_time = time.thread_time() - start_cpu
+		peak = max(tracemalloc.get_traced_memory()[1], stack.pop())
+		if stack:
+			stack[-1] = max(stack[-1], peak)
+		recorder.add({'stage' : name, 'start' : start - recorder.origin, 'wall time' : wall_time,
+		 'cpu time' : cpu_time, 'allocated bytes' : int(peak - start_memory),
+		  'shapes' : {key : list(getattr(value, 'shape', ())) for key, value in arrays.items()},
+		   'thread' : threading.get_ident()})
+
+
+def bind(func, executor):
+	"""
+	Returns func bound to a copy of the current context, so stages
+	it runs on an executor thread are recorded too. func is returned
+	as it is if no Recorder is active or the executor isn't a thread
+	pool, since contexts can't be sent to other processes.
+	"""
+	if _recorder.get() is None or not isinstance(executor, ThreadPoolExecutor):
+		return func
+	return functools.partial(contextvars.copy_context().run, func)
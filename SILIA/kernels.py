@@ -0,0 +1,59 @@
+import numpy as np
+try:
+	import numba
+	prange = numba.prange
+except ImportError:
+	numba = None
+	prange = range
+
+
+def fused_sums(signal, time, est_freq, est_phase, window, channel_block):
+	"""
+	Returns the sums over time of the mixed signal and the phase
+	shifted mixed signal (rows 0 and 1) for every channel, evaluating
+	the reference, multiplying by the signal and the window and
+	accumulating in a single loop, without the temporary arrays of
+	mix. Blocks of channel_block channels are processed in parallel
+	when compiled with Numba, otherwise this runs as plain Python.
+	"""
+	num_rows, num_channels = signal.shape
+	num_blocks = (num_channels + channel_block - 1)//channel_block
+	sums = np.zeros((2, num_channels))
+	for b in prange(num_blocks):
+		start = b * channel_block
+		stop = min(start + channel_block, num_channels)
+		for t in range(num_rows):
+			phase = est_freq*time[t]*2*np.pi + est_phase
+			#The 2 is a scaling factor
+			weight = 2 * window[t]
+			ref_val = weight * np.sin(phase)
+			ref_val_phaseShift = weight * np.cos(phase)
+			for c in range(start, stop):
+				sums[0, c] += ref_val * signal[t, c]
+				sums[1, c] += ref_val_phaseShift * signal[t, c]
+	return sums
+
+
+#Numba's parallel threading layer makes forking the process unsafe once a
+#compiled kernel has run, so every process pool in SILIA is spawned.
+if numba is not None:
+	compiled_fused_sums = numba.njit(parallel = True, nogil = True, cache = True)(fused_sums)
+else:
+	compiled_fused_sums = None
+
+
+def get_kernel(engine):
+	"""
+	Returns the fused mix and reduce kernel for an engine name, or None
+	for the 'numpy' engine (the usual mix and FFT lowpass). 'numba'
+	needs Numba to be installed, 'auto' uses it if it is.
+	"""
+	if engine == 'numpy':
+		return None
+	if engine == 'numba':
+		if compiled_fused_sums is None:
+			raise ImportError("The 'numba' engine needs Numba to be installed")
+		return compiled_fused_sums
+	if engine == 'auto':
+		return compiled_fused_sums
+	raise ValueError("Unknown engine: " + str(engine))
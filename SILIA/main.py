@@ -2,20 +2,139 @@ import numpy as np
 import sys
 from .reference_signal import *
 from .helper import *
+from .fft_backend import get_backend
+from .planner import make_plan
+from .instrument import Recorder, current_recorder, stage
+from .frames import stream_lock_in
+from .kernels import get_kernel
+from .parallel import WorkerPool
+import copy
 
 class Amplifier:
 	"""
 	A software Lock-in Amplifier
 	"""
 
-	def __init__(self, cutoff, pbar = True):
+	def __init__(self, cutoff, pbar = True, prefilter = None, lowpass = 'fft',
+	 time_constant = None, slope = 6, fir_taps = None, block_size = 8192, workers = None,
+	  window_executor = None, window_workers = None, fft_backend = 'numpy',
+	   fft_workers = None, fast_len = False, channel_block = 64, retain_spectra = False,
+	    window = 'hanning', memory_budget = None, instrument = False,
+	     engine = 'numpy'):
 		"""
 		Takes in a cutoff frequency (float) as an input
 		as well as whether or not to display the progress
-		bar.
+		bar. pbar can also be an Observer (see progress.py)
+		that receives the start, progress and end of each stage,
+		for example a LoggingObserver. With pbar False, nothing
+		is reported.
+
+		prefilter optionally decimates the mixed signal before
+		the lowpass filter, either with a polyphase FIR filter
+		('polyphase') or a cascaded integrator-comb filter ('cic').
+		This makes the lowpass much cheaper for oversampled data
+		with a low cutoff frequency.
+
+		lowpass selects the lowpass filter engine. 'fft' is the 
+		brick-wall FFT filter. 'iir' is a cascade of RC filters 
+		like a hardware lock-in, with the given time_constant 
+		(seconds, defaults to 1/(2 pi cutoff)) and slope (6, 12, 
+		18 or 24 dB/oct). 'fir' is a windowed FIR filter with 
+		fir_taps taps (chosen from the cutoff by default) applied by
+		overlap-save in blocks of block_size samples, so memory does 
+		not grow with the length of the record.
+
+		workers sets the number of processes the channels are 
+		split between. The signal, reference values and results 
+		are kept in shared memory. The processes and the shared 
+		signal are reused by every window and reference of a call
+		to amplify. The processes are spawned, so scripts using 
+		workers need an if __name__ == '__main__' guard.
+
+		The windows used for errorbars are processed in parallel on
+		window_executor, any concurrent.futures executor. By default,
+		a thread pool with window_workers threads is used. Results
+		are always combined in window order.
+
+		fft_backend selects the FFT implementation of the 'fft' 
+		lowpass: 'numpy', 'scipy', 'fftw' (pyFFTW) or 'auto'. The 
+		scipy and pyFFTW backends use fft_workers threads. If fast_len
+		is True, records are zero-padded to a fast transform length.
+		channel_block channels are transformed together.
+
+		If retain_spectra is True, the spectra of the mixed signals
+		from the last call to amplify are kept so the output can be
+		recomputed for a new cutoff with reevaluate, without mixing
+		or forward transforms.
+
+		window is applied to the mixed signal: 'hanning',
+		'rectangular', 'blackman' or 'flattop' (only with the 'fft'
+		lowpass and a cutoff of 0). With a rectangular
+		window, a cutoff of 0 and no interpolation, every errorbar
+		window is computed from cumulative sums in O(n) in total.
+
+		lowpass, channel_block, block_size and workers can be 'auto',
+		in which case they are picked for each input by a cost model
+		calibrated for this machine (see planner.calibrate), keeping
+		the predicted peak memory below memory_budget bytes if given
+		(with a warning if it can't be). An 'auto' lowpass is 'fft',
+		or 'fir' when the spectra would not fit in the budget, never
+		'iir', whose response differs. The planner also decides 
+		whether the 'auto' engine uses the fused kernel. explain 
+		returns the plan without running it.
+
+		If instrument is True, the wall time, CPU time, allocated 
+		memory and array shapes of each stage (fit, resample, mix,
+		window, fft, mask, inverse fft, reduce, convert and so on)
+		are recorded and returned under 'instrumentation' in the 
+		output. The Recorder of the last call is kept as 
+		self.instrumentation and can export them as JSON lines or
+		a Chrome trace, see instrument.py.
+
+		engine selects how the 'fft' lowpass with a cutoff of 0 is
+		computed. 'numpy' mixes and filters with NumPy. 'numba' fuses
+		the reference, mixing, window and sum into one compiled loop
+		run in parallel over blocks of channel_block channels, which
+		needs Numba. 'auto' uses Numba if it is installed and NumPy
+		otherwise. See kernels.py. Once the Numba kernel has run, 
+		forking the process can hang, so process pools passed as 
+		window_executor should use the 'spawn' start method.
 		"""
 		self.cutoff = cutoff
 		self.pbar = pbar
+		self.prefilter = prefilter
+		self.lowpass = lowpass
+		self.time_constant = time_constant
+		self.slope = slope
+		self.fir_taps = fir_taps
+		self.block_size = block_size
+		self.workers = workers
+		self.window_executor = window_executor
+		self.window_workers = window_workers
+		self.fft_backend = get_backend(fft_backend, fft_workers, fast_len)
+		self.channel_block = channel_block
+		self.retain_spectra = retain_spectra
+		self.spectra = None
+		self.window = window
+		self.memory_budget = memory_budget
+		self.instrument = instrument
+		self.instrumentation = None
+		self.pool = None
+		get_kernel(engine)
+		self.engine = engine
+
+	def __getstate__(self):
+		"""
+		Executors, worker pools and recorders can't be pickled, so they
+		are dropped when the amplifier is sent to another process. So
+		are the retained spectra, which workers don't need.
+		"""
+		state = self.__dict__.copy()
+		state['window_executor'] = None
+		state['instrumentation'] = None
+		state['pool'] = None
+		state['spectra'] = None
+		return state
 
 	def update_cutoff(self, new_cutoff):
 		"""
@@ -25,26 +144,283 @@ class Amplifier:
 		self.cutoff = new_cutoff
 		return new_cutoff
 
+	def reevaluate(self, cutoff = None):
+		"""
+		Recomputes the magnitudes and phases from the last call to
+		amplify for a new cutoff (by default the current cutoff) using
+		the retained spectra. Errorbars and traces are not recomputed.
+		"""
+		if self.spectra is None:
+			raise ValueError("No spectra retained, set retain_spectra and call amplify first")
+		if cutoff is None:
+			cutoff = self.cutoff
+		out = {}
+		if self.spectra['fit params'] is not None:
+			out['ref. fit params'] = self.spectra['fit params']
+		for i, spectra in enumerate(self.spectra['references']):
+			label = 'reference ' + str(i + 1)
+			mags, phases = lowpass_spectra(self, spectra, cutoff)
+			out[label] = {'magnitudes' : np.reshape(mags, self.spectra['shape']).tolist()}
+			if phases is not None:
+				out[label]['phases'] = np.reshape(phases, self.spectra['shape']).tolist()
+			if 'mask' in self.spectra:
+				for key in out[label]:
+					out[label][key] = scatter(out[label][key], self.spectra['mask'],
+					 self.spectra['fill value']).tolist()
+		return out
+
+	def explain(self, signal_input, references, fit_ref = True, interpolate = False,
+	 num_windows = 1, window_size = 1):
+		"""
+		Returns the plan amplify would follow for these inputs: the
+		lowpass engine, channel_block, block_size, workers and engine,
+		the execution path, the predicted peak memory (bytes), whether
+		it is within memory_budget and the predicted runtime (seconds).
+		"""
+		signal = np.asarray(signal_input['signal'])
+		num_channels = int(np.prod(signal.shape[1:]))
+		return make_plan(self, signal.shape[0], num_channels, len(references),
+		 signal.dtype.itemsize, fit_ref, interpolate, num_windows, window_size)
+
+	def planned(self, plan):
+		"""
+		Returns a copy of the amplifier with the settings of plan.
+		"""
+		amplifier = copy.copy(self)
+		for setting in ['lowpass', 'channel_block', 'block_size', 'workers', 'engine']:
+			setattr(amplifier, setting, plan[setting])
+		return amplifier
+
+	def amplify_frames(self, references, source, fit_ref = True, block_frames = 64, prefetch = 2):
+		"""
+		Performs lock-in on a stack of frames read from source (see 
+		frames.py) block_frames at a time, with prefetch blocks read 
+		ahead on a background thread, so the stack never has to fit in
+		memory. Needs the 'iir' lowpass or a cutoff of 0. Returns the
+		output of amplify without errorbars, with magnitude and phase
+		images for each reference.
+		"""
+		fit_params, magnitudes, phases = stream_lock_in(self, source, references,
+		 fit_ref, block_frames, prefetch)
+		out = {}
+		if fit_ref:
+			out['ref. fit params'] = {'frequencies' : [params[0] for params in fit_params],
+			 'phases' : [params[1] for params in fit_params]}
+		for i in range(len(magnitudes)):
+			label = 'reference ' + str(i + 1)
+			out[label] = {'magnitudes' : magnitudes[i].tolist()}
+			if fit_ref:
+				out[label]['phases'] = phases[i].tolist()
+		return out
+
+	def amplify_batch(self, signal_inputs, references, fit_ref = True, **kwargs):
+		"""
+		Performs lock-in on each of a list of signal inputs with the 
+		same references, which are fitted once. Inputs with the same 
+		timestamps are concatenated along the channels and demodulated
+		together, whatever the shape of their channels. Other arguments
+		are passed to amplify, except mask and screen which apply to a 
+		single input. Returns a list with the output for each input.
+		"""
+		if 'mask' in kwargs or 'screen' in kwargs:
+			raise ValueError("mask and screen can't be used with amplify_batch")
+		if fit_ref:
+			kwargs['ref_fit'] = fit(references)
+		#Groups the inputs by their timestamps
+		groups = []
+		for i, signal_input in enumerate(signal_inputs):
+			time = np.asarray(signal_input['time'])
+			for group_time, members in groups:
+				if np.array_equal(group_time, time):
+					members.append(i)
+					break
+			else:
+				groups.append((time, [i]))
+
+		outs = [None] * len(signal_inputs)
+		for time, members in groups:
+			signals = [np.asarray(signal_inputs[i]['signal']) for i in members]
+			columns = [np.reshape(signal, (len(signal), -1)) for signal in signals]
+			out = self.amplify(references, {'time' : time, 'signal' : np.concatenate(columns, axis = 1)},
+			 fit_ref, **kwargs)
+			bounds = np.cumsum([column.shape[1] for column in columns])[:-1]
+			#Splits the outputs of each reference back into the inputs
+			for i, signal in zip(members, signals):
+				outs[i] = {key : value for key, value in out.items() if not key.startswith('reference ')}
+			for label in out:
+				if not label.startswith('reference '):
+					continue
+				for i in members:
+					outs[i][label] = {}
+				for key, value in out[label].items():
+					value = np.asarray(value)
+					for i, signal, part in zip(members, signals, np.split(value, bounds, axis = -1)):
+						outs[i][label][key] = np.reshape(part, value.shape[:-1] + signal.shape[1:]).tolist()
+		return outs
+
+	def amplify_cutoffs(self, references, signal_input, cutoffs, fit_ref = True,
+	 window_size = 1, interpolate = False):
+		"""
+		Performs lock-in for each of the cutoff frequencies in cutoffs,
+		sharing the mixing and forward transforms between them. Returns
+		a list with the output (without errorbars) for each cutoff. A
+		prefilter decimates for the highest cutoff, so the retained 
+		spectra hold every cutoff.
+		"""
+		retain_spectra = self.retain_spectra
+		cutoff = self.cutoff
+		self.retain_spectra = True
+		try:
+			highest = int(np.argmax(cutoffs))
+			self.update_cutoff(cutoffs[highest])
+			out = self.amplify(references, signal_input, fit_ref = fit_ref,
+			 window_size = window_size, interpolate = interpolate)
+			outs = [out if k == highest else self.reevaluate(new_cutoff)
+			 for k, new_cutoff in enumerate(cutoffs)]
+		finally:
+			self.retain_spectra = retain_spectra
+			self.update_cutoff(cutoff)
+		return outs
+
 	def amplify(self, references, signal_input, fit_ref = True,
-	 num_windows = 1, window_size = 1, interpolate = False):
+	 num_windows = 1, window_size = 1, interpolate = False,
+	  time_resolved = False, output_rate = None, target_error = None, error_fraction = 0.95,
+	   error_method = 'windows', num_blocks = 32, num_resamples = 200, mask = None,
+	    fill_value = np.nan, screen = None, screen_samples = 4096, ref_fit = None):
 
 		"""
 		Performs simultaneous lock-in. See the docstrings in helper.py and 
 		the tutorial example for a more detailed description of the input
 		parameters and outputs. The docstring for the lock_in function in
 		helper.py might be helpful. 
+
+		If time_resolved is True, the output also contains the lock-in
+		magnitudes (and phases) over time under 'magnitude traces' (and
+		'phase traces') for each reference, sampled at output_rate (Hz,
+		defaults to twice the cutoff) at the timestamps in 'trace time'.
+
+		If target_error is given, errorbar windows are added until the
+		standard error of the magnitude, relative to the magnitude, is
+		below target_error for error_fraction of the channels. num_windows
+		is then the maximum number of windows and 'indices' lists the 
+		windows that were used.
+
+		error_method selects how errorbars are computed. 'windows' 
+		demodulates num_windows windows separately. 'bootstrap' and 
+		'jackknife' mix the signal once, average it in num_blocks 
+		blocks and resample those (num_resamples times for the
+		bootstrap) to estimate the spread of the magnitude and phase
+		from windows of window_size. num_windows is then ignored.
+
+		mask is an optional boolean array with the shape of the 
+		channels (for example a region of interest in an image). Only
+		the selected channels are demodulated and the outputs are
+		fill_value everywhere else.
+
+		If screen is given, a coarse estimate of the signal-to-noise
+		ratio of each channel at each reference frequency is made 
+		first from the signal shifted to 0 Hz and decimated to about
+		screen_samples timestamps (see screen_snr in helper.py). Only 
+		channels with an SNR of at least screen for some reference are
+		demodulated, the others are masked out.
+		'screening' in the output holds the threshold, the number of
+		channels and of skipped channels and the estimated SNRs.
+
+		ref_fit optionally gives the fit parameters of the references
+		(as returned by reference_signal.fit), so references used for
+		several inputs are only fitted once.
 		"""
+		check_window(self, self.cutoff)
+		if self.instrument and current_recorder() is None:
+			with Recorder() as recorder:
+				out = self.amplify(references, signal_input, fit_ref, num_windows,
+				 window_size, interpolate, time_resolved, output_rate, target_error,
+				  error_fraction, error_method, num_blocks, num_resamples, mask, fill_value,
+				   screen, screen_samples, ref_fit)
+			self.instrumentation = recorder
+			out['instrumentation'] = recorder.records
+			return out
+
+		if screen is not None:
+			#Estimates the SNR of every channel and only demodulates those above the threshold
+			signal = np.asarray(signal_input['signal'])
+			if fit_ref:
+				#The fit is passed on, so it isn't repeated for the lock-in
+				if ref_fit is None:
+					with stage('fit'):
+						ref_fit = fit(references)
+				frequencies = [params[0] for params in ref_fit]
+			else:
+				frequencies = [dominant_frequency(ref['signal'], np.asarray(ref['time'])) for ref in references]
+			with stage('screen', signal = signal):
+				snr = screen_snr(np.reshape(signal, (len(signal), -1)), np.asarray(signal_input['time']),
+				 frequencies, screen_samples)
+			selected = np.reshape(np.any(snr >= screen, axis = 0), signal.shape[1:])
+			if mask is not None:
+				selected &= np.asarray(mask, dtype = bool)
+			out = self.amplify(references, signal_input, fit_ref, num_windows, window_size,
+			 interpolate, time_resolved, output_rate, target_error, error_fraction, error_method,
+			  num_blocks, num_resamples, selected, fill_value, ref_fit = ref_fit)
+			out['screening'] = {'threshold' : screen, 'channels' : int(selected.size),
+			 'skipped' : int(selected.size - np.count_nonzero(selected)),
+			  'snr' : np.reshape(snr, (len(references),) + signal.shape[1:]).tolist()}
+			return out
+
+		if mask is not None:
+			#Demodulates the selected channels only and scatters the results back
+			signal = np.asarray(signal_input['signal'])
+			mask = np.asarray(mask, dtype = bool)
+			if mask.shape != signal.shape[1:]:
+				raise ValueError("The mask has shape " + str(mask.shape) + " but the channels have shape "
+				 + str(signal.shape[1:]))
+			out = self.amplify(references, {'time' : signal_input['time'], 'signal' : signal[:, mask]},
+			 fit_ref, num_windows, window_size, interpolate, time_resolved, output_rate, target_error,
+			  error_fraction, error_method, num_blocks, num_resamples, ref_fit = ref_fit)
+			for label in out:
+				if label.startswith('reference '):
+					for key in out[label]:
+						out[label][key] = scatter(out[label][key], mask, fill_value).tolist()
+			if self.retain_spectra:
+				self.spectra['mask'] = mask
+				self.spectra['fill value'] = fill_value
+			return out
+
+		if 'auto' in [self.lowpass, self.channel_block, self.block_size, self.workers]:
+			amplifier = self.planned(self.explain(signal_input, references, fit_ref,
+			 interpolate, num_windows, window_size))
+			out = amplifier.amplify(references, signal_input, fit_ref, num_windows,
+			 window_size, interpolate, time_resolved, output_rate, target_error,
+			  error_fraction, error_method, num_blocks, num_resamples, ref_fit = ref_fit)
+			self.spectra = amplifier.spectra
+			return out
+
+		if self.workers is not None and self.workers > 1 and self.pool is None:
+			#One pool of worker processes for every window and reference
+			with WorkerPool(self.workers) as self.pool:
+				try:
+					return self.amplify(references, signal_input, fit_ref, num_windows,
+					 window_size, interpolate, time_resolved, output_rate, target_error,
+					  error_fraction, error_method, num_blocks, num_resamples, ref_fit = ref_fit)
+				finally:
+					self.pool = None
+
+		resampled = error_method != 'windows'
+		errorbars = num_windows != 1 or resampled
+		retained = []
 
 		#Fits the reference signals to sine waves.
 
 		if fit_ref:
 
-			ref_vals = fit(references)
+			with stage('fit'):
+				ref_vals = fit(references) if ref_fit is None else ref_fit
 
 			magnitudes = []
 			angles = []
 			mag_errors = []
 			ang_errors = []
+			mag_traces = []
+			ang_traces = []
 			fit_vals = {'frequencies' : [], 'phases' : []}
 			for fit_params in ref_vals:
 				est_freq, est_phase, est_offset, est_amp = fit_params[0],\
@@ -62,44 +438,82 @@ class Amplifier:
 				for i in range(1, dim):
 					arr_len *= size[i]
 				signal = np.reshape(signal, (size[0], arr_len))
+				if self.pool is not None:
+					#Windows of the signal are demodulated from one shared copy
+					self.pool.share(signal, keep = True)
 
-				#Applies lock-in with errorbars
-				curr_magnitudes, curr_angles, curr_mag_err, curr_phase_err, indices = lock_in(self, signal,
-				 time, est_freq, est_phase, num_windows, window_size, interpolate)
+				if resampled:
+					#Applies lock-in for results, then resamples for errorbars
+					if not self.retain_spectra:
+						curr_magnitudes, curr_angles, _, _, _ = lock_in(self, signal,
+						 time, est_freq, est_phase, 1, 1, interpolate)
+					curr_mag_err, curr_phase_err = lock_in_resampled(self, signal, time, est_freq,
+					 est_phase, window_size, interpolate, error_method, num_blocks, num_resamples)
+				elif num_windows == 1 and self.retain_spectra:
+					#Results come from the retained spectra below
+					curr_mag_err, curr_phase_err = 0, 0
+				else:
+					#Applies lock-in with errorbars
+					curr_magnitudes, curr_angles, curr_mag_err, curr_phase_err, indices = lock_in(self, signal,
+					 time, est_freq, est_phase, num_windows, window_size, interpolate, target_error, error_fraction)
 
 				#Applies lock-in for results - only necessary if there is more than one window.
-				if num_windows != 1:
+				if num_windows != 1 and not resampled and not self.retain_spectra:
 					curr_magnitudes, curr_angles, _, _, _ = lock_in(self,signal,
 					 time, est_freq, est_phase, num_windows = 1, window_size = 1,
 					  interpolate = interpolate)
 
+				#Keeps the spectra of the mixed signal and uses them for the results.
+				if self.retain_spectra:
+					spectra = lock_in_spectra(self, signal, time, est_freq, est_phase,
+					 window_size if num_windows == 1 else 1, interpolate)
+					retained.append(spectra)
+					curr_magnitudes, curr_angles = lowpass_spectra(self, spectra, self.cutoff)
+
+				#Keeps the lock-in output over time.
+				if time_resolved:
+					trace_time, curr_mag_traces, curr_ang_traces = lock_in_traces(self, signal,
+					 time, est_freq, est_phase, window_size, interpolate, output_rate)
+					mag_traces.append(curr_mag_traces)
+					ang_traces.append(curr_ang_traces)
+
 				magnitudes.append(curr_magnitudes)
 				angles.append(curr_angles)
 				mag_errors.append(curr_mag_err)
 				ang_errors.append(curr_phase_err)
 
+			if self.retain_spectra:
+				self.spectra = {'fit params' : fit_vals, 'shape' : size[1: dim], 'references' : retained}
 			i = 0
 			out = {'ref. fit params' : fit_vals}
-			if num_windows != 1:
+			if num_windows != 1 and not resampled:
 				out['indices'] = indices
-			while i < len(magnitudes):
-				label = 'reference ' + str(i + 1)
-				#reshaping output into their original form without the time dependence
-				mags = np.reshape(magnitudes[i], size[1: dim])
-				phases = np.reshape(angles[i], size[1: dim])
-				out[label] = {'magnitudes' : mags.tolist(), 'phases' : phases.tolist()}
-				if num_windows != 1:
-					magnitude_stds = np.reshape(mag_errors[i], size[1: dim])
-					phase_stds = np.reshape(ang_errors[i], size[1: dim])
-					out[label]['magnitude stds'] = magnitude_stds.tolist()
-					out[label]['phase stds'] = phase_stds.tolist()
+			if time_resolved:
+				out['trace time'] = trace_time.tolist()
+			with stage('convert'):
+				while i < len(magnitudes):
+					label = 'reference ' + str(i + 1)
+					#reshaping output into their original form without the time dependence
+					mags = np.reshape(magnitudes[i], size[1: dim])
+					phases = np.reshape(angles[i], size[1: dim])
+					out[label] = {'magnitudes' : mags.tolist(), 'phases' : phases.tolist()}
+					if errorbars:
+						magnitude_stds = np.reshape(mag_errors[i], size[1: dim])
+						phase_stds = np.reshape(ang_errors[i], size[1: dim])
+						out[label]['magnitude stds'] = magnitude_stds.tolist()
+						out[label]['phase stds'] = phase_stds.tolist()
+					if time_resolved:
+						trace_shape = (len(trace_time),) + size[1: dim]
+						out[label]['magnitude traces'] = np.reshape(mag_traces[i], trace_shape).tolist()
+						out[label]['phase traces'] = np.reshape(ang_traces[i], trace_shape).tolist()
 				
-				i += 1
+					i += 1
 		else:
 			magnitudes = []
 			angles = []
 			mag_errors = []
 			ang_errors = []
+			mag_traces = []
 			for ref in references:
 				ref_time = np.asarray(ref['time'])
 				ref_sig = np.asarray(ref['signal'])
@@ -113,32 +527,67 @@ class Amplifier:
 				for i in range(1, dim):
 					arr_len *= size[i]
 				signal = np.reshape(signal, (size[0], arr_len))
+				if self.pool is not None:
+					#Windows of the signal are demodulated from one shared copy
+					self.pool.share(signal, keep = True)
 
-				#Applies lock-in with errorbars
-				curr_magnitudes, curr_mag_err, indices = lock_in_no_fit(self, signal, sig_time, ref_sig, 
-					ref_time, num_windows, window_size, interpolate)
+				if resampled:
+					#Applies lock-in for results, then resamples for errorbars
+					if not self.retain_spectra:
+						curr_magnitudes, _, _ = lock_in_no_fit(self, signal, sig_time, ref_sig,
+							ref_time, 1, 1, interpolate)
+					curr_mag_err = lock_in_no_fit_resampled(self, signal, sig_time, ref_sig, ref_time,
+						window_size, interpolate, error_method, num_blocks, num_resamples)
+				elif num_windows == 1 and self.retain_spectra:
+					#Results come from the retained spectrum below
+					curr_mag_err = 0
+				else:
+					#Applies lock-in with errorbars
+					curr_magnitudes, curr_mag_err, indices = lock_in_no_fit(self, signal, sig_time, ref_sig, 
+						ref_time, num_windows, window_size, interpolate, target_error, error_fraction)
 
 				#Applies lock-in for results - only necessary if there is more than one window.
-				if num_windows != 1:
+				if num_windows != 1 and not resampled and not self.retain_spectra:
 					curr_magnitudes, _, _ = lock_in_no_fit(self,signal, sig_time, ref_sig,
 						ref_time, num_windows = 1, window_size = 1,
 						 interpolate = interpolate)
 
+				#Keeps the spectrum of the mixed signal and uses it for the results.
+				if self.retain_spectra:
+					spectra = lock_in_no_fit_spectra(self, signal, sig_time, ref_sig, ref_time,
+						window_size if num_windows == 1 else 1, interpolate)
+					retained.append(spectra)
+					curr_magnitudes, _ = lowpass_spectra(self, spectra, self.cutoff)
+
+				#Keeps the lock-in output over time.
+				if time_resolved:
+					trace_time, curr_mag_traces = lock_in_no_fit_traces(self, signal, sig_time,
+					 ref_sig, ref_time, window_size, interpolate, output_rate)
+					mag_traces.append(curr_mag_traces)
+
 				magnitudes.append(curr_magnitudes)
 				mag_errors.append(curr_mag_err)
 
+			if self.retain_spectra:
+				self.spectra = {'fit params' : None, 'shape' : size[1: dim], 'references' : retained}
 			i = 0
 			out = {}
-			if num_windows != 1:
+			if num_windows != 1 and not resampled:
 				out['indices'] = indices
-			while i < len(magnitudes):
-				label = 'reference ' + str(i + 1)
-				#reshaping output into their original form without the time dependence
-				mags = np.reshape(magnitudes[i], size[1: dim])
-				out[label] = {'magnitudes' : mags.tolist()}
-				if num_windows != 1:
-					magnitude_stds = np.reshape(mag_errors[i], size[1: dim])
-					out[label]['magnitude stds'] = magnitude_stds.tolist()				
-				i += 1
+			if time_resolved:
+				out['trace time'] = trace_time.tolist()
+			with stage('convert'):
+				while i < len(magnitudes):
+					label = 'reference ' + str(i + 1)
+					#reshaping output into their original form without the time dependence
+					mags = np.reshape(magnitudes[i], size[1: dim])
+					out[label] = {'magnitudes' : mags.tolist()}
+					if errorbars:
+						magnitude_stds = np.reshape(mag_errors[i], size[1: dim])
+						out[label]['magnitude stds'] = magnitude_stds.tolist()
+					if time_resolved:
+						trace_shape = (len(trace_time),) + size[1: dim]
+						out[label]['magnitude traces'] = np.reshape(mag_traces[i], trace_shape).tolist()
+					i += 1
 
 		return out
\ No newline at end of file
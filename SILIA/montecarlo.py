@@ -0,0 +1,175 @@
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .accumulators import RunningStats
+from .progress import get_observer
+
+
+def grid(**axes):
+	"""
+	Returns every combination of the values of each axis as a list of
+	parameter dicts, for example grid(snr = [0.25, 0.01], cycles = [20, 170]).
+	"""
+	names = list(axes)
+	return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def trial_rng(seed, point, trial):
+	"""
+	Returns the random number generator of a trial. It depends only on
+	the seed and the position of the trial in the sweep, so results don't
+	depend on the number of workers, the order trials finish in or on
+	resuming.
+	"""
+	return np.random.default_rng(np.random.SeedSequence(seed, spawn_key = (point, trial)))
+
+
+def run_trial(trial, params, seed, point, number):
+	"""
+	Runs one trial and reduces each of the metrics it returns (a value or
+	an array of values, for example the error of every channel) to its
+	count, mean and sum of squared deviations.
+	"""
+	metrics = trial(params, trial_rng(seed, point, number))
+	summary = {}
+	for metric, values in metrics.items():
+		stats = RunningStats().update_many(np.ravel(values))
+		summary[metric] = [stats.count, float(stats.mean), float(stats.m2)]
+	return point, number, summary
+
+
+def load_log(log_path, header):
+	"""
+	Returns the summaries of the trials completed in an earlier run of
+	the same sweep, read from its log. A partly written last line from
+	an interrupted run is cut from the log, so new trials are appended
+	after the last complete line. Lines that can't be read are skipped.
+	"""
+	completed = {}
+	if not os.path.exists(log_path):
+		return completed
+	with open(log_path, 'rb+') as f:
+		lines = f.readlines()
+		if lines and not lines[-1].endswith(b'\n'):
+			f.truncate(sum(len(line) for line in lines[:-1]))
+			lines = lines[:-1]
+	if not lines:
+		return completed
+	if json.loads(lines[0]) != header:
+		raise ValueError("The trial log " + log_path + " belongs to a different sweep")
+	for line in lines[1:]:
+		try:
+			entry = json.loads(line)
+		except ValueError:
+			continue
+		completed[entry['point'], entry['trial']] = entry['metrics']
+	return completed
+
+
+def summarize(points, num_trials, completed):
+	"""
+	Merges the trial summaries of each point, in trial order, into one
+	row per point and metric.
+	"""
+	rows = []
+	for i, params in enumerate(points):
+		stats = {}
+		for k in range(num_trials):
+			for metric, (count, mean, m2) in completed.get((i, k), {}).items():
+				trial_stats = RunningStats()
+				trial_stats.count, trial_stats.mean, trial_stats.m2 = count, np.float64(mean), np.float64(m2)
+				stats.setdefault(metric, RunningStats()).merge(trial_stats)
+		for metric, metric_stats in stats.items():
+			row = dict(params)
+			row.update({'metric' : metric, 'trials' : num_trials, 'count' : metric_stats.count,
+			 'mean' : float(metric_stats.mean), 'std' : float(metric_stats.std()),
+			  'standard error' : float(metric_stats.std()/np.sqrt(metric_stats.count))})
+			rows.append(row)
+	return rows
+
+
+def write_results(path, rows):
+	"""
+	Writes the rows of summarize to path as CSV, one row per point and metric.
+	"""
+	fields = list(dict.fromkeys(field for row in rows for field in row))
+	with open(path, 'w', newline = '') as f:
+		writer = csv.DictWriter(f, fieldnames = fields)
+		writer.writeheader()
+		writer.writerows(rows)
+
+
+def run(trial, points, num_trials, path, seed = 0, workers = None, resume = True, pbar = False):
+	"""
+	Runs num_trials trials at each point of a parameter grid, spread over
+	worker processes, and writes the mean, standard deviation and
+	standard error of each metric at each point to path as CSV.
+	Parameters
+	----------
+	trial : function
+		trial(params, rng) runs one trial with the parameters of a grid
+		point and the random number generator rng, and returns a dict of
+		metrics, each a value or an array of values (for example the
+		squared error of the lock-in magnitude in each channel). It
+		must be picklable (defined at module level) if workers > 1.
+		Worker processes are spawned, so scripts need an
+		if __name__ == '__main__' guard.
+	points : list of dicts
+		The parameters of each point, see grid. They are stored as JSON.
+	num_trials : int
+		Number of trials at each point.
+	path : string
+		Path of the results file. Completed trials are logged to
+		path + '.trials.jsonl' as they finish.
+	seed : int
+		Seed of the sweep, see trial_rng.
+	workers : int or None
+		Number of worker processes, trials run in this process if None.
+	resume : bool
+		Whether to skip trials already in the log of an interrupted run
+		of the same sweep. Otherwise the log is started over.
+	pbar : bool or Observer
+		Progress reporting, stage 'trials', see progress.py.
+	Returns
+	-------
+	rows : list of dicts
+		The rows of the results file.
+	"""
+	log_path = path + '.trials.jsonl'
+	header = json.loads(json.dumps({'seed' : seed, 'num trials' : num_trials, 'points' : points}))
+	completed = load_log(log_path, header) if resume else {}
+	pending = [(i, k) for i in range(len(points)) for k in range(num_trials) if (i, k) not in completed]
+
+	observer = get_observer(pbar)
+	total = len(points) * num_trials
+	observer.started('trials', total)
+	with open(log_path, 'a' if completed else 'w') as log:
+		if not completed:
+			log.write(json.dumps(header) + '\n')
+
+		def record(result):
+			point, number, summary = result
+			completed[point, number] = summary
+			log.write(json.dumps({'point' : point, 'trial' : number, 'metrics' : summary}) + '\n')
+			log.flush()
+			observer.progress('trials', len(completed), total)
+
+		if workers is None or workers <= 1:
+			for i, k in pending:
+				record(run_trial(trial, points[i], seed, i, k))
+		else:
+			#Spawned rather than forked, forking after Numba's parallel kernels can hang
+			with ProcessPoolExecutor(max_workers = workers,
+			 mp_context = multiprocessing.get_context('spawn')) as executor:
+				futures = [executor.submit(run_trial, trial, points[i], seed, i, k) for i, k in pending]
+				for future in as_completed(futures):
+					record(future.result())
+	observer.finished('trials')
+
+	rows = summarize(points, num_trials, completed)
+	write_results(path, rows)
+	return rows
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+def is_even(time, est_freq, tolerance = 1e-9, ulps = 16):
+	"""
+	Returns whether the timestamps are evenly spaced closely enough
+	that the reference phase at every timestamp is within tolerance
+	(radians), or within ulps units in the last place of the largest
+	phase, of the phase at evenly spaced times. The phase can't be
+	computed more precisely than that, so long records of timestamps
+	such as np.arange(n)/f_s count as evenly spaced.
+	"""
+	if len(time) < 2:
+		return True
+	step = (time[-1] - time[0])/(len(time) - 1)
+	deviation = np.max(np.abs(time - (time[0] + step * np.arange(len(time)))))
+	largest_phase = 2 * np.pi * abs(est_freq) * max(abs(time[0]), abs(time[-1]))
+	allowed = max(tolerance, ulps * np.finfo(np.float64).eps * largest_phase)
+	return 2 * np.pi * abs(est_freq) * deviation <= allowed
+
+
+def reference_blocks(time, est_freq, est_phase, block_size = 4096, dtype = np.float64):
+	"""
+	Yields the start of each block of block_size timestamps and the
+	fitted reference signal, sin(2 pi est_freq t + est_phase), and its pi/2
+	phase shift (cos) over the block, generated lazily.
+
+	For evenly spaced timestamps, the unit phasor of each block is its
+	exactly computed starting phasor rotated by a table of the phase
+	advance over each step within a block (angle addition), so the
+	transcendental functions are only evaluated once per block and for
+	the table. Re-anchoring every block bounds the rounding drift to a
+	few ulps. Unevenly spaced timestamps fall back to np.sin and np.cos.
+	Values are computed in double precision and returned as dtype.
+	"""
+	time = np.asarray(time, dtype = np.float64)
+	even = is_even(time, est_freq)
+	if even and len(time) > 1:
+		step = (time[-1] - time[0])/(len(time) - 1)
+		rotation = np.exp(2j * np.pi * est_freq * step * np.arange(block_size))
+	for start in range(0, len(time), block_size):
+		stop = min(start + block_size, len(time))
+		if even and len(time) > 1:
+			anchor = np.exp(1j * (2 * np.pi * est_freq * (time[0] + step * start) + est_phase))
+			phasor = anchor * rotation[:stop - start]
+			yield start, phasor.imag.astype(dtype), phasor.real.astype(dtype)
+		else:
+			phase = est_freq * time[start : stop] * 2 * np.pi + est_phase
+			yield start, np.sin(phase).astype(dtype), np.cos(phase).astype(dtype)
+
+
+def reference_values(time, est_freq, est_phase, dtype = np.float64, block_size = 4096):
+	"""
+	Returns the fitted reference signal and its pi/2 phase shift at
+	every timestamp, the same as refValue and refValue_phaseShift, in
+	one pass. See reference_blocks.
+	"""
+	ref_vals = np.empty(len(time), dtype = dtype)
+	ref_vals_phaseShift = np.empty(len(time), dtype = dtype)
+	for start, sin, cos in reference_blocks(time, est_freq, est_phase, block_size, dtype):
+		ref_vals[start : start + len(sin)] = sin
+		ref_vals_phaseShift[start : start + len(cos)] = cos
+	return ref_vals, ref_vals_phaseShift
@@ -0,0 +1,207 @@
+import numpy as np
+import copy
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from .helper import get_window, decimate, filter_mixed
+from .progress import get_observer
+
+
+def to_shared(array):
+	"""
+	Copies an array into a new shared memory block. Returns the shared
+	memory block and a description (name, shape, dtype) that other
+	processes can use to attach to it with from_shared.
+	"""
+	array = np.asarray(array)
+	shm = SharedMemory(create = True, size = max(array.nbytes, 1))
+	shared = np.ndarray(array.shape, dtype = array.dtype, buffer = shm.buf)
+	shared[...] = array
+	return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def from_shared(description):
+	"""
+	Attaches to a shared memory block made by to_shared and returns the
+	shared memory block and an array backed by it. 
+	"""
+	name, shape, dtype = description
+	shm = SharedMemory(name = name)
+	return shm, np.ndarray(shape, dtype = np.dtype(dtype), buffer = shm.buf)
+
+
+def row_range(original, array):
+	"""
+	Returns the (start, end) rows of original that array is a view of,
+	or None if it isn't a view of a block of rows of original.
+	"""
+	if (array.dtype != original.dtype or array.shape[1:] != original.shape[1:]
+	 or array.strides != original.strides or original.strides[0] <= 0):
+		return None
+	offset = array.__array_interface__['data'][0] - original.__array_interface__['data'][0]
+	if offset % original.strides[0] != 0:
+		return None
+	start = offset//original.strides[0]
+	if start < 0 or start + len(array) > len(original):
+		return None
+	return start, start + len(array)
+
+
+class WorkerPool:
+	"""
+	The worker processes and the shared copies of the arrays used by
+	parallel_demodulate, kept for one call to amplify so that every
+	window and reference reuses them. On exit, the processes are shut
+	down and the shared memory is freed. The processes are spawned
+	rather than forked, since windows submit work from several threads
+	and forking a multithreaded process can deadlock.
+	"""
+	def __init__(self, workers):
+		self.workers = workers
+		self.executor = ProcessPoolExecutor(max_workers = workers,
+		 mp_context = multiprocessing.get_context('spawn'))
+		self.shared = []
+		self.lock = threading.Lock()
+
+	def share(self, array, keep = False):
+		"""
+		Returns the description of a shared copy of array, the rows of it
+		that array covers and the shared memory block if it was made for
+		this call only (None if it is kept). Arrays that are blocks of
+		rows of a kept array, such as the windows of the signal, use its
+		copy. With keep, a new copy is kept until exit.
+		"""
+		array = np.asarray(array)
+		with self.lock:
+			for original, _, description in self.shared:
+				rows = row_range(original, array)
+				if rows is not None:
+					return description, rows, None
+			shm, description = to_shared(array)
+			if keep:
+				#The array is kept too, so its memory can't be reused by another array
+				self.shared.append((array, shm, description))
+				return description, (0, len(array)), None
+			return description, (0, len(array)), shm
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.executor.shutdown()
+		for _, shm, _ in self.shared:
+			shm.close()
+			shm.unlink()
+		self.shared = []
+
+
+def release(shm):
+	"""
+	Frees a shared memory block made for a single call.
+	"""
+	if shm is not None:
+		shm.close()
+		shm.unlink()
+
+
+def demodulate_block(self, signal_desc, rows, time_desc, references_desc, result_desc, start, end):
+	"""
+	Mixes and lowpass filters the channels from start to end of the given
+	rows of the shared signal and writes their magnitudes and phases into
+	the shared result.
+	"""
+	blocks = []
+	try:
+		for description in (signal_desc, time_desc, references_desc, result_desc):
+			blocks.append(from_shared(description))
+		(_, signal), (_, time), (_, references), (_, result) = blocks
+		signal = signal[rows[0] : rows[1]]
+		#The 2 is a scaling factor, as in mix.
+		window = 2 * get_window(self.window, len(signal)).reshape((len(signal), 1))
+		mixed_phaseShift = None
+		if references.shape[1] > 1 and self.lowpass == 'fft' and self.prefilter is None:
+			#One complex mixed signal, see mix_complex
+			mixed = signal[:, start:end] * ((references[:, 0:1] + 1j * references[:, 1:2]) * window)
+		else:
+			mixed = signal[:, start:end] * (references[:, 0:1] * window)
+		if references.shape[1] > 1 and not np.iscomplexobj(mixed):
+			mixed_phaseShift = signal[:, start:end] * (references[:, 1:2] * window)
+		if self.prefilter is not None:
+			mixed, dec_time = decimate(mixed, time, self.cutoff, self.prefilter)
+			if mixed_phaseShift is not None:
+				mixed_phaseShift, _ = decimate(mixed_phaseShift, time, self.cutoff, self.prefilter)
+			time = dec_time
+		magnitudes, phases = filter_mixed(self, mixed, mixed_phaseShift, time)
+		result[0, start:end] = magnitudes
+		if phases is not None:
+			result[1, start:end] = phases
+	finally:
+		for shm, _ in blocks:
+			shm.close()
+
+
+def parallel_demodulate(self, signal, time, references):
+	"""
+	Demodulates the channels of the signal in self.workers processes,
+	on the amplifier's WorkerPool if it has one (see amplify) and 
+	otherwise on a pool made for this call. Each process handles a
+	contiguous block of channels. 
+	Parameters
+	----------
+	signal : 2D array of floats
+		Intensity values for each channel over time.
+	time : 1D array of floats
+		Evenly spaced timestamps for the data.
+	references : 2D array of floats
+		Reference values at each timestamp, the columns are the reference
+		and (for a fitted reference) its pi/2 phase shift.
+	Returns
+	-------
+	magnitudes : 1D array of floats
+		Lock-in output magnitudes for each channel
+	phases : 1D array of floats or None
+		Lock-in output phases for each channel, None if there is only
+		one reference column.
+	"""
+	if self.pool is None:
+		with WorkerPool(self.workers) as pool:
+			worker_amp = copy.copy(self)
+			worker_amp.pool = pool
+			return parallel_demodulate(worker_amp, signal, time, references)
+	observer = get_observer(self.pbar)
+	num_channels = signal.shape[1]
+	worker_amp = copy.copy(self)
+	worker_amp.pbar = False
+	worker_amp.workers = None
+	worker_amp.pool = None
+	bounds = np.linspace(0, num_channels, min(self.workers, num_channels) + 1).astype(int)
+
+	temporary = []
+	futures = []
+	try:
+		signal_desc, rows, shm = self.pool.share(signal)
+		temporary.append(shm)
+		descriptions = []
+		for array in (time, references):
+			description, _, shm = self.pool.share(array)
+			temporary.append(shm)
+			descriptions.append(description)
+		result_shm, result_desc = to_shared(np.zeros((2, num_channels)))
+		temporary.append(result_shm)
+		futures = [self.pool.executor.submit(demodulate_block, worker_amp, signal_desc, rows,
+		 *descriptions, result_desc, start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+		observer.started('parallel demodulate', len(futures))
+		for done, future in enumerate(futures):
+			future.result()
+			observer.progress('parallel demodulate', done + 1, len(futures))
+		observer.finished('parallel demodulate')
+		result = np.ndarray((2, num_channels), dtype = np.float64, buffer = result_shm.buf).copy()
+	finally:
+		#Blocks in use by other workers are only freed once they finish
+		wait(futures)
+		for shm in temporary:
+			release(shm)
+	if references.shape[1] > 1:
+		return result[0], result[1]
+	return result[0], None
@@ -0,0 +1,219 @@
+import numpy as np
+import json
+import os
+import timeit
+import warnings
+import scipy.signal
+import scipy.interpolate
+from .helper import get_window, rc_sos
+from .kernels import get_kernel, compiled_fused_sums
+
+
+#Seconds per unit of work for each stage, used until calibrate is run.
+DEFAULT_CALIBRATION = {
+	'fit' : 2e-6,		#per reference sample
+	'interpolate' : 2e-8,	#per sample per channel
+	'mix' : 5e-9,		#per sample per channel per quadrature
+	'fft' : 1e-9,		#per n log2(n) per channel per transform
+	'iir' : 1e-8,		#per sample per channel per section
+	'prefix sum' : 3e-9,	#per sample per channel
+	'fused' : 2e-9,		#per sample per channel, both quadratures
+}
+
+
+def calibration_path():
+	"""
+	Returns where the calibration constants are stored, the file named
+	by the SILIA_CALIBRATION environment variable or ~/.silia/calibration.json
+	"""
+	return os.environ.get('SILIA_CALIBRATION',
+	 os.path.join(os.path.expanduser('~'), '.silia', 'calibration.json'))
+
+
+#Calibration constants already read, by path, so planning doesn't read the file.
+_calibrations = {}
+
+
+def load_calibration(path = None):
+	"""
+	Returns the stored calibration constants, or the defaults if
+	calibrate has not been run on this machine. The file is only read
+	the first time, calibrate updates the stored constants.
+	"""
+	path = path or calibration_path()
+	if path not in _calibrations:
+		calibration = dict(DEFAULT_CALIBRATION)
+		if os.path.exists(path):
+			with open(path) as f:
+				calibration.update(json.load(f))
+		_calibrations[path] = calibration
+	return dict(_calibrations[path])
+
+
+def best_time(func, repeats = 5):
+	"""
+	Returns the fastest of repeats calls to func in seconds.
+	"""
+	return min(timeit.repeat(func, number = 1, repeat = repeats))
+
+
+def calibrate(path = None, num_samples = 2**16, num_channels = 16):
+	"""
+	Times each stage of the lock-in on this machine with a small
+	micro-benchmark and stores the constants for the planner.
+	Returns the calibration constants.
+	"""
+	from .reference_signal import fit
+	time = np.arange(num_samples)/1000
+	signal = np.random.normal(0, 1, (num_samples, num_channels))
+	reference = np.sin(2 * np.pi * 10 * time)
+	window = get_window('hanning', num_samples).reshape((-1, 1))
+	sos = rc_sos(1, 24, 1000)
+	work = num_samples * num_channels
+
+	#Stages that can't be timed here (the fused kernel without Numba) keep the defaults
+	calibration = dict(DEFAULT_CALIBRATION)
+	calibration['fit'] = best_time(lambda: fit([{'time' : time, 'signal' : reference}]), 3)/num_samples
+	calibration['interpolate'] = best_time(lambda: scipy.interpolate.interp1d(time, signal,
+	 axis = 0)(time[:-1] + 0.0005))/work
+	calibration['mix'] = best_time(lambda: signal * np.reshape(reference, (-1, 1)) * 2 * window)/work
+	calibration['fft'] = best_time(lambda: np.fft.irfft(np.fft.rfft(signal, axis = 0),
+	 num_samples, axis = 0))/(2 * work * np.log2(num_samples))
+	calibration['iir'] = best_time(lambda: scipy.signal.sosfilt(sos, signal, axis = 0))/(work * len(sos))
+	calibration['prefix sum'] = best_time(lambda: np.cumsum(signal * np.reshape(reference, (-1, 1)),
+	 axis = 0))/work
+	if compiled_fused_sums is not None:
+		calibration['fused'] = best_time(lambda: compiled_fused_sums(signal, time, 10, 0,
+		 window[:, 0], 64))/work
+
+	path = path or calibration_path()
+	directory = os.path.dirname(path)
+	if directory:
+		os.makedirs(directory, exist_ok = True)
+	with open(path, 'w') as f:
+		json.dump(calibration, f, indent = 1)
+	_calibrations[path] = dict(calibration)
+	return calibration
+
+
+def make_plan(self, num_samples, num_channels, num_refs, itemsize, fit_ref, interpolate,
+ num_windows = 1, window_size = 1, calibration = None):
+	"""
+	Picks how the amplifier runs a lock-in of the given size and predicts
+	its peak memory and runtime. Settings of the amplifier that are 'auto'
+	are chosen here, the others are taken as they are. An 'auto' lowpass
+	is the 'fft' lowpass, or the 'fir' lowpass when the spectra don't fit
+	in the memory budget and the cutoff is above 0. 'iir' has a different
+	response, so it is only planned when it is asked for.
+	Parameters
+	----------
+	self : Amplifier
+		The amplifier whose settings are planned.
+	num_samples, num_channels, num_refs : int
+		Size of the input, number of timestamps, channels and references.
+	itemsize : int
+		Bytes per value of the input signal.
+	fit_ref, interpolate, num_windows, window_size
+		As passed to Amplifier.amplify.
+	calibration : dict
+		Seconds per unit of work for each stage, see calibrate.
+	Returns
+	-------
+	plan : dict
+		'lowpass', 'channel_block', 'block_size', 'workers' and 'engine'
+		to use, the execution 'path', the 'predicted peak memory' 
+		(bytes), whether it is 'within budget' and the 'predicted
+		runtime' (seconds). A warning is given if the predicted peak
+		memory is over the memory budget.
+	"""
+	#Stages missing from an older calibration use the defaults
+	calibration = dict(DEFAULT_CALIBRATION, **(calibration or load_calibration()))
+	budget = self.memory_budget or float('inf')
+	cutoff = self.cutoff
+	quadratures = 2 if fit_ref else 1
+	#Samples demodulated, counting errorbar windows and the results pass
+	if num_windows == 1:
+		demodulated = int(num_samples * window_size)
+	else:
+		demodulated = int(num_samples * window_size) * num_windows + num_samples
+	#Input plus interpolated copy and mixed signals, all as float64
+	base_memory = num_samples * num_channels * (itemsize + 8 * interpolate + 8 * quadratures)
+	spectrum_bytes = 16 * (num_samples//2 + 1) + 8 * num_samples
+
+	lowpass = self.lowpass
+	if lowpass == 'auto':
+		full_block = quadratures * spectrum_bytes * num_channels
+		lowpass = 'fir' if (base_memory + min(full_block, 64 * quadratures * spectrum_bytes) > budget
+		 and cutoff > 0) else 'fft'
+
+	channel_block = self.channel_block
+	if channel_block == 'auto':
+		channel_block = min(num_channels, 256)
+		if self.memory_budget is not None:
+			room = max(budget - base_memory, 0)
+			channel_block = int(max(1, min(channel_block, room//(quadratures * spectrum_bytes))))
+
+	block_size = self.block_size
+	if block_size == 'auto':
+		block_size = 2**int(np.clip(np.log2(max(num_samples, 2))//2 + 4, 10, 18))
+
+	if lowpass == 'fft':
+		filter_memory = quadratures * spectrum_bytes * channel_block
+		filter_time = calibration['fft'] * 2 * quadratures * demodulated * np.log2(max(num_samples, 2)) * num_channels
+	elif lowpass == 'fir':
+		filter_memory = quadratures * 24 * block_size * num_channels
+		filter_time = calibration['fft'] * 2 * quadratures * demodulated * np.log2(block_size) * num_channels * 2
+	else:
+		filter_memory = quadratures * 8 * num_samples * num_channels
+		filter_time = calibration['iir'] * (self.slope//6) * quadratures * demodulated * num_channels
+
+	path = 'mix and ' + lowpass + ' lowpass'
+	stage_time = calibration['mix'] * quadratures * demodulated * num_channels + filter_time
+	if (lowpass == 'fft' and self.window == 'rectangular' and cutoff == 0
+	 and self.prefilter is None and not interpolate):
+		path = 'prefix sum'
+		stage_time = calibration['prefix sum'] * quadratures * num_samples * num_channels * 2
+		filter_memory = 8 * quadratures * num_samples * num_channels
+
+	#The fused kernel (see kernels.py) replaces mixing and the cutoff 0 FFT lowpass
+	#when it is available, unless the channels are split between processes.
+	engine = 'numpy' if self.engine == 'auto' else self.engine
+	if (path != 'prefix sum' and lowpass == 'fft' and cutoff == 0 and self.prefilter is None
+	 and fit_ref and get_kernel(self.engine) is not None
+	  and not (isinstance(self.workers, int) and self.workers > 1)):
+		fused_time = calibration['fused'] * demodulated * num_channels
+		if self.engine == 'numba' or fused_time < stage_time:
+			path = 'fused'
+			engine = 'numba'
+			stage_time = fused_time
+			#Only the sums of the mixed signals are kept
+			base_memory -= num_samples * num_channels * 8 * quadratures
+			filter_memory = 16 * num_channels
+	if interpolate:
+		stage_time += calibration['interpolate'] * demodulated * num_channels
+
+	workers = self.workers
+	if workers == 'auto' and path == 'fused':
+		#The fused kernel runs its channel blocks on threads itself
+		workers = None
+	elif workers == 'auto':
+		#Processes only pay off when there is enough work to share out.
+		workers = min(os.cpu_count() or 1, num_channels) if stage_time * num_refs > 1 else None
+	parallel = workers if workers is not None and workers > 1 else 1
+
+	runtime = num_refs * stage_time/parallel
+	if fit_ref:
+		runtime += calibration['fit'] * num_samples * num_refs
+	peak_memory = base_memory + filter_memory
+	if parallel > 1:
+		#The signal and references are copied into shared memory.
+		peak_memory += num_samples * (num_channels + quadratures + 1) * 8
+
+	within_budget = self.memory_budget is None or peak_memory <= self.memory_budget
+	if not within_budget:
+		warnings.warn("The predicted peak memory, " + str(int(peak_memory)) + " bytes, is over the "
+		 "memory budget of " + str(self.memory_budget) + " bytes")
+
+	return {'lowpass' : lowpass, 'channel_block' : channel_block, 'block_size' : block_size,
+	 'workers' : workers, 'engine' : engine, 'path' : path, 'predicted peak memory' : int(peak_memory),
+	  'within budget' : within_budget, 'predicted runtime' : float(runtime)}
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from tqdm import tqdm
+
+
+class Observer:
+	"""
+	Receives the progress of a lock-in. The stages are 'mix', 'lowpass'
+	(FFT lowpass over the channels), 'iir lowpass', 'fir lowpass',
+	'windows' (errorbar windows) and 'parallel demodulate' (blocks of
+	channels sent to worker processes). Stages with a total report
+	progress in units of channels, windows or blocks. Streamed frames
+	report a 'frames' stage (see frames.py) and Monte Carlo sweeps a
+	'trials' stage (see montecarlo.py).
+
+	This base class ignores everything and is the observer used when
+	the progress bar is off, subclass it to report progress elsewhere.
+	Stages may run at the same time on different threads.
+	"""
+	def started(self, stage, total = None):
+		"""
+		Called when a stage starts, with the number of units of work if known.
+		"""
+		pass
+
+	def progress(self, stage, done, total):
+		"""
+		Called when done of the total units of work of a stage are complete.
+		"""
+		pass
+
+	def finished(self, stage):
+		"""
+		Called when a stage is complete.
+		"""
+		pass
+
+
+#Shared by every lock-in without progress reporting.
+NULL_OBSERVER = Observer()
+
+
+#Messages printed by the tqdm observer when each stage starts.
+DESCRIPTIONS = {
+	'mix' : "Mixing...",
+	'lowpass' : "Applying Lowpass on each Channel",
+	'iir lowpass' : "Applying IIR Lowpass",
+	'fir lowpass' : "Applying FIR Lowpass",
+	'windows' : "Splitting Input...",
+	'parallel demodulate' : "Demodulating on worker processes...",
+	'trials' : "Running trials...",
+	'frames' : "Locking in frames...",
+}
+
+
+class TqdmObserver(Observer):
+	"""
+	Prints a message when each stage starts and shows a tqdm progress
+	bar for the stages with a total. This is the observer used when
+	pbar is True.
+	"""
+	def __init__(self, **tqdm_args):
+		self.tqdm_args = dict({'position' : 0, 'leave' : True}, **tqdm_args)
+		self.bars = {}
+
+	def started(self, stage, total = None):
+		print(DESCRIPTIONS.get(stage, stage), flush = True)
+		if total is not None:
+			self.bars[stage, threading.get_ident()] = tqdm(total = total, **self.tqdm_args)
+
+	def progress(self, stage, done, total):
+		bar = self.bars.get((stage, threading.get_ident()))
+		if bar is not None:
+			bar.update(done - bar.n)
+
+	def finished(self, stage):
+		bar = self.bars.pop((stage, threading.get_ident()), None)
+		if bar is not None:
+			bar.close()
+
+
+class LoggingObserver(Observer):
+	"""
+	Logs the start of each stage and, when it finishes, its duration and
+	throughput (units of work per second) at the given level. Progress
+	within a stage is logged at the DEBUG level.
+	"""
+	def __init__(self, logger = None, level = logging.INFO):
+		self.logger = logger or logging.getLogger('SILIA')
+		self.level = level
+		self.starts = {}
+
+	def started(self, stage, total = None):
+		self.starts[stage, threading.get_ident()] = (time.perf_counter(), total)
+		if total is None:
+			self.logger.log(self.level, "%s started", stage)
+		else:
+			self.logger.log(self.level, "%s started, %d units", stage, total)
+
+	def progress(self, stage, done, total):
+		self.logger.debug("%s %.1f%% complete", stage, 100 * done/total)
+
+	def finished(self, stage):
+		start, total = self.starts.pop((stage, threading.get_ident()), (None, None))
+		if start is None:
+			self.logger.log(self.level, "%s finished", stage)
+			return
+		elapsed = time.perf_counter() - start
+		if total is None or elapsed == 0:
+			self.logger.log(self.level, "%s finished in %.3g s", stage, elapsed)
+		else:
+			self.logger.log(self.level, "%s finished in %.3g s, %.3g units/s", stage, elapsed, total/elapsed)
+
+
+def get_observer(pbar):
+	"""
+	Returns the observer for a pbar setting: pbar itself if it is an
+	Observer, a TqdmObserver if it is True and the no-op observer otherwise.
+	"""
+	if isinstance(pbar, Observer):
+		return pbar
+	if pbar:
+		return TqdmObserver()
+	return NULL_OBSERVER
@@ -0,0 +1,160 @@
+import numpy as np
+
+
+def rngs(seed = None, num_streams = 1):
+	"""
+	Returns num_streams independent random number generators spawned
+	from seed (an int, a SeedSequence or None for fresh entropy), for
+	example one per worker process. The streams depend only on the seed
+	and their position, so results are reproducible for any number of
+	workers as long as each unit of work uses the same stream.
+	"""
+	if not isinstance(seed, np.random.SeedSequence):
+		seed = np.random.SeedSequence(seed)
+	return [np.random.default_rng(child) for child in seed.spawn(num_streams)]
+
+
+def as_rng(rng):
+	"""
+	Returns rng if it is a Generator, otherwise a Generator seeded with it.
+	"""
+	if isinstance(rng, np.random.Generator):
+		return rng
+	return np.random.default_rng(rng)
+
+
+def timestamps(num_samples, sample_rate, jitter = 0, rng = None):
+	"""
+	Returns num_samples timestamps at sample_rate (Hz) starting from 0,
+	each offset by Gaussian timing jitter with a standard deviation of
+	jitter (seconds). Jittered timestamps are sorted so they stay increasing.
+	"""
+	time = np.arange(num_samples)/sample_rate
+	if jitter > 0:
+		time = np.sort(time + as_rng(rng).normal(0, jitter, num_samples))
+	return time
+
+
+def disk_mask(shape, center, radius):
+	"""
+	Returns a boolean image of the given shape that is True within radius
+	pixels of center, for restricting a component to part of an image.
+	"""
+	rows, columns = np.ogrid[:shape[0], :shape[1]]
+	return (rows - center[0])**2 + (columns - center[1])**2 <= radius**2
+
+
+def component(frequency, amplitude = 1, phase = 0, mask = None):
+	"""
+	Returns a sinusoidal component of a synthetic signal, amplitude *
+	sin(2 pi frequency t + phase), present in the channels where mask
+	(a boolean array of the channel shape) is True, or all channels if
+	mask is None. amplitude may also be an array of the channel shape.
+	"""
+	return {'frequency' : frequency, 'amplitude' : amplitude, 'phase' : phase, 'mask' : mask}
+
+
+def noise_level(components, snr):
+	"""
+	Returns the noise standard deviation for a signal-to-noise ratio snr,
+	the power of the components (amplitude**2/2 each) over the noise
+	variance, as in the paper's Fig. 5.
+	"""
+	power = sum(np.max(np.square(c['amplitude']))/2 for c in components)
+	return np.sqrt(power/snr)
+
+
+def signal(time, shape, components, noise = 1., snr = None, rng = None, out = None,
+ chunk_size = 65536, dtype = np.float64):
+	"""
+	Generates a multi-channel signal, the sum of the sinusoidal
+	components plus Gaussian noise, chunk_size timestamps at a time.
+	Parameters
+	----------
+	time : 1D array of floats
+		Timestamps of the signal.
+	shape : tuple of ints
+		Shape of the channels at each timestamp, for example (rows,
+		columns) for an image stack.
+	components : list of dicts
+		Sinusoidal components, see component.
+	noise : float
+		Standard deviation of the Gaussian noise.
+	snr : float or None
+		If given, sets the noise for this signal-to-noise ratio, see
+		noise_level.
+	rng : Generator, int or None
+		Random number generator, or a seed for one. The same seed gives
+		the same signal for any chunk_size.
+	out : array or None
+		Array of shape (len(time),) + shape to write the signal into,
+		for example a memmap from open_memmap for signals too large
+		for memory. A new array is returned if None.
+	chunk_size : int
+		Number of timestamps generated at once.
+	dtype : data type
+		Data type of the new array, if out is None.
+	Returns
+	-------
+	signal : array
+		The signal, out if it was given.
+	"""
+	rng = as_rng(rng)
+	shape = tuple(shape)
+	time = np.asarray(time)
+	if out is None:
+		out = np.empty((len(time),) + shape, dtype = dtype)
+	if snr is not None:
+		noise = noise_level(components, snr)
+	#Each component's amplitude in each channel, zero outside its mask
+	amplitudes = []
+	for c in components:
+		amplitude = np.broadcast_to(np.asarray(c['amplitude'], dtype = np.float64), shape)
+		if c['mask'] is not None:
+			amplitude = np.where(c['mask'], amplitude, 0)
+		amplitudes.append(amplitude)
+	for start in range(0, len(time), chunk_size):
+		t = time[start : start + chunk_size]
+		if noise > 0:
+			chunk = noise * rng.standard_normal((len(t),) + shape)
+		else:
+			chunk = np.zeros((len(t),) + shape)
+		for c, amplitude in zip(components, amplitudes):
+			wave = np.sin(2 * np.pi * c['frequency'] * t + c['phase'])
+			chunk += wave.reshape((-1,) + (1,) * len(shape)) * amplitude
+		out[start : start + len(t)] = chunk
+	return out
+
+
+def references(time, frequencies, phases = None):
+	"""
+	Returns reference inputs for Amplifier.amplify, a sine wave at each
+	of the frequencies (with the given phases) sampled at time.
+	"""
+	if phases is None:
+		phases = np.zeros(len(frequencies))
+	return [{'time' : time, 'signal' : np.sin(2 * np.pi * frequency * time + phase)}
+	 for frequency, phase in zip(frequencies, phases)]
+
+
+def open_memmap(path, shape, dtype = np.float64):
+	"""
+	Returns a writable memory-mapped .npy file of the given shape, to
+	generate signals into without holding them in memory.
+	"""
+	return np.lib.format.open_memmap(path, mode = 'w+', dtype = dtype, shape = tuple(shape))
+
+
+def generate(num_samples, sample_rate, shape, components, noise = 1., snr = None, jitter = 0,
+ rng = None, out = None, chunk_size = 65536):
+	"""
+	Returns references (one per component frequency, measured at the
+	evenly spaced sample times) and a signal input for Amplifier.amplify,
+	sampled with timing jitter. See timestamps and signal.
+	"""
+	rng = as_rng(rng)
+	even_time = timestamps(num_samples, sample_rate)
+	time = timestamps(num_samples, sample_rate, jitter, rng)
+	frequencies = list(dict.fromkeys(c['frequency'] for c in components))
+	data = signal(time, shape, components, noise, snr, rng, out, chunk_size)
+	return references(even_time, frequencies), {'time' : time, 'signal' : data}
@@ -0,0 +1,29 @@
+import pytest
+import numpy as np
+import numpy.testing as nptest
+from .accumulators import *
+
+
+def test_running_stats():
+	#Testing the running mean and variance against numpy, including merging
+	values = np.random.normal(3, 2, (50, 4))
+	first = RunningStats()
+	second = RunningStats()
+	for row in values[:20]:
+		first.update(row)
+	for row in values[20:]:
+		second.update(row)
+	merged = first.merge(second)
+	assert merged.count == 50
+	nptest.assert_allclose(merged.mean, np.mean(values, axis = 0))
+	nptest.assert_allclose(merged.std(), np.std(values, axis = 0, ddof = 1))
+
+
+def test_circular_stats():
+	#Testing circular statistics for angles on either side of pi
+	angles = np.pi + np.random.normal(0, 0.01, (100, 3))
+	stats = CircularStats()
+	for row in np.angle(np.exp(1j * angles)):
+		stats.update(row)
+	nptest.assert_allclose(np.absolute(stats.mean), np.pi, atol = 0.01)
+	nptest.assert_allclose(stats.std(), np.std(angles, axis = 0, ddof = 1), rtol = 10**(-3))
@@ -0,0 +1,32 @@
+import pytest
+import json
+import copy
+from .benchmarks import *
+
+
+def test_run(tmp_path):
+	#Testing a small benchmark run and the regression check against itself
+	scenarios = [scenario('tiny', 512, (3,)), scenario('tiny windows', 512, (2, 2), fit_ref = False,
+	 num_windows = 2, window_size = 0.5)]
+	path = str(tmp_path/'results.json')
+	results = run(scenarios, repeats = 2, path = path, report = None)
+	with open(path) as f:
+		assert json.load(f) == results
+	for name in ['tiny', 'tiny windows']:
+		assert results['scenarios'][name]['median'] > 0
+		assert results['scenarios'][name]['peak memory'] > 0
+	assert compare(results, results) == []
+
+
+def test_compare():
+	#Testing that only slowdowns beyond the threshold and noise count as regressions
+	baseline = {'scenarios' : {'a' : {'median' : 1., 'iqr' : 0.05, 'peak memory' : 1000}}}
+	results = copy.deepcopy(baseline)
+	results['scenarios']['a']['median'] = 1.05
+	assert compare(results, baseline, threshold = 0.1) == []
+	results['scenarios']['a']['median'] = 1.2
+	assert len(compare(results, baseline, threshold = 0.1)) == 1
+	results['scenarios']['a']['iqr'] = 0.3
+	assert compare(results, baseline, threshold = 0.1) == []
+	results['scenarios']['a']['peak memory'] = 2000
+	assert len(compare(results, baseline, threshold = 0.1)) == 1
@@ -0,0 +1,39 @@
+import pytest
+import numpy as np
+import numpy.testing as nptest
+from .fft_backend import *
+from .helper import fft_lowpass
+
+
+def test_backends_match_numpy():
+	#Testing that every available backend gives the numpy lowpass
+	data = np.random.normal(0, 1, (1009, 4))
+	expected = np.transpose([fft_lowpass(data[:, i], 20, 1000, 1009) for i in range(4)])
+	names = ['numpy', 'scipy', 'auto']
+	if pyfftw is not None:
+		names.append('fftw')
+	for name in names:
+		backend = get_backend(name, workers = 2)
+		nptest.assert_allclose(fft_lowpass(data, 20, 1000, 1009, backend), expected, atol = 10**(-10))
+
+
+def test_fast_len():
+	#Testing zero-padding to a fast length for a prime number of samples
+	backend = get_backend('scipy', fast_len = True)
+	assert backend.padded_length(1009) == 1024
+	data = np.ones((1009, 2))
+	filtered = fft_lowpass(data, 0, 1000, 1009, backend, crop = False)
+	assert filtered.shape == (1024, 2)
+	nptest.assert_allclose(np.sum(filtered, axis = 0)/1009, [2, 2])
+
+
+def test_fftw_threads():
+	#Testing that threads transforming arrays of the same shape don't share plans
+	pytest.importorskip('pyfftw')
+	from concurrent.futures import ThreadPoolExecutor
+	backend = get_backend('fftw')
+	data = [np.random.normal(0, 1, (1024, 4)) for _ in range(16)]
+	with ThreadPoolExecutor(max_workers = 4) as executor:
+		results = list(executor.map(lambda x: backend.rfft(x, 1024), data))
+	for x, result in zip(data, results):
+		nptest.assert_allclose(result, np.fft.rfft(x, axis = 0), atol = 1e-10)
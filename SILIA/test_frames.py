@@ -0,0 +1,50 @@
+import pytest
+import os
+import numpy as np
+import numpy.testing as nptest
+from .main import Amplifier
+from .frames import *
+from . import synth
+
+
+def make_stack(num_frames = 1000, shape = (6, 5)):
+	time = synth.timestamps(num_frames, 1000)
+	mask = synth.disk_mask(shape, (2, 2), 2)
+	stack = synth.signal(time, shape, [synth.component(100, mask = mask)], rng = 3)
+	return time, stack, synth.references(time, [100, 130])
+
+
+def test_stream_lock_in(tmp_path):
+	#Testing that streamed frames give the same images as amplify on the whole stack
+	time, stack, references = make_stack()
+	path = str(tmp_path/'video.raw')
+	stack.astype(np.float32).tofile(path)
+	raw = RawFrames(path, stack.shape[1:], np.float32, frame_rate = 1000)
+	nptest.assert_allclose(raw.time, time)
+	signal = {'time' : time, 'signal' : stack.astype(np.float32)}
+	for amplifier in [Amplifier(0, pbar = False), Amplifier(5, pbar = False, lowpass = 'iir')]:
+		for fit_ref in [True, False]:
+			expected = amplifier.amplify(references, signal, fit_ref = fit_ref)
+			out = amplifier.amplify_frames(references, raw, fit_ref = fit_ref, block_frames = 96)
+			assert out.keys() == expected.keys()
+			for label in ['reference 1', 'reference 2']:
+				for key in expected[label]:
+					nptest.assert_allclose(out[label][key], expected[label][key], rtol = 1e-9, atol = 1e-12)
+
+
+def test_unsupported():
+	#Testing that lowpass filters that need the whole record are refused
+	time, stack, references = make_stack(100)
+	with pytest.raises(ValueError):
+		Amplifier(5, pbar = False).amplify_frames(references, ArrayFrames(stack, time))
+
+
+def test_image_sequence(tmp_path):
+	#Testing that an image sequence reads back the frames
+	Image = pytest.importorskip('PIL.Image')
+	stack = np.random.default_rng(0).integers(0, 255, (5, 4, 3), dtype = np.uint8)
+	for i, frame in enumerate(stack):
+		Image.fromarray(frame).save(str(tmp_path/('frame{:03d}.png'.format(i))))
+	source = ImageSequence(str(tmp_path/'frame*.png'), frame_rate = 10)
+	assert len(source) == 5
+	nptest.assert_array_equal(np.concatenate([block for _, block in prefetch(source, 2)]), stack)
@@ -3,6 +3,7 @@ import numpy as np
 import numpy.testing as nptest
 from .helper import *
 import scipy.signal
+from .main import Amplifier
 
 
 def test_find_nearest():
@@ -64,3 +65,132 @@ def test_mix_no_fit_no_interp():
 
 	nptest.assert_allclose(mixed[0], 2 * np.transpose([reference])\
 	 * window.reshape((window.size, 1)))
+
+def test_apply_lowpass_traces():
+	#Testing the time resolved lowpass on a signal with a slowly drifting amplitude
+	time = np.arange(0, 10, 1/1000)
+	amplitude = 1 + 0.05 * time
+	signal = np.transpose([amplitude * np.sin(2 * np.pi * 50 * time + 0.3)])
+	mixed, mixed_phaseShift, _ = mix(signal, time, 50, 0, interpolate = False, pbar = False, window = 'rectangular')
+	trace_time, r, theta = apply_lowpass_traces(mixed, mixed_phaseShift, time, cutoff = 2,
+	 output_rate = 4, pbar = False)
+	assert r.shape == (40, 1)
+	assert theta.shape == (40, 1)
+	nptest.assert_allclose(r[4:-4, 0], 1 + 0.05 * trace_time[4:-4], rtol = 0.01)
+	nptest.assert_allclose(theta[4:-4, 0], 0.3, atol = 0.01)
+
+def test_decimate():
+	#Testing that both decimation filters keep the mean and remove the mixing products
+	time = np.arange(0, 1, 1/100000)
+	data = np.transpose([0.5 + np.sin(2 * np.pi * 2000 * time)])
+	windowed = data * np.hanning(time.size).reshape((time.size, 1))
+	assert decimation_stages(10, 100000, time.size) == [8, 8, 6]
+	for method in ['polyphase', 'cic']:
+		decimated, dec_time = decimate(data, time, 10, method)
+		assert len(decimated) == len(dec_time) == 261
+		nptest.assert_allclose(decimated[10:-10], 0.5, atol = 0.05)
+		decimated, dec_time = decimate(windowed, time, 10, method)
+		nptest.assert_allclose(np.mean(decimated), np.mean(windowed), rtol = 10**(-3))
+
+def test_iir_lowpass():
+	#Testing the RC lowpass settles to the DC level and can be run in chunks
+	time = np.arange(0, 1, 1/2000)
+	data = np.transpose([1 + np.sin(2 * np.pi * 100 * time), np.cos(2 * np.pi * 100 * time)])
+	sos = rc_sos(time_constant = 0.05, slope = 24, f_s = 2000)
+	assert sos.shape == (4, 6)
+	filtered, zf = iir_lowpass(data, sos)
+	nptest.assert_allclose(filtered[-1], [1, 0], atol = 10**(-3))
+	first, zi = iir_lowpass(data[:777], sos)
+	second, _ = iir_lowpass(data[777:], sos, zi)
+	nptest.assert_allclose(np.concatenate((first, second)), filtered)
+
+def test_overlap_save():
+	#Testing the blockwise FIR filter against direct convolution
+	data = np.random.normal(0, 1, (5000, 3))
+	kernel = fir_kernel(cutoff = 50, f_s = 1000)
+	filtered = np.concatenate(list(overlap_save(data, kernel, nfft = 256)))
+	expected = np.transpose([np.convolve(data[:, i], kernel, 'same') for i in range(3)])
+	nptest.assert_allclose(filtered, expected, atol = 10**(-10))
+
+def test_window_batches():
+	#Testing the order windows are visited in for adaptive errorbars
+	class amp:
+		window_workers = 2
+	assert list(window_batches(amp, 5, adaptive = False)) == [[0, 1, 2, 3, 4]]
+	assert list(window_batches(amp, 10, adaptive = True)) == [[0, 8, 4], [2, 6], [1, 9], [5, 3], [7]]
+
+def test_resample_errors():
+	#Testing bootstrap and jackknife errors against the standard error of the mean
+	rng = np.random.default_rng(0)
+	data = 1 + rng.normal(0, 1, (6400, 3))
+	means = block_means(data, 64)
+	nptest.assert_allclose(np.mean(means, axis = 0), np.mean(data, axis = 0))
+	expected = np.std(means, axis = 0)/np.sqrt(64)
+	for method in ['bootstrap', 'jackknife']:
+		mag_errors, phase_errors = resample_errors(means, 1, method, 2000, rng)
+		nptest.assert_allclose(mag_errors, expected, rtol = 0.1)
+		assert phase_errors.shape == (3,)
+
+def test_prefix_sum_windows():
+	#Testing the cumulative sum lock-in against mixing and filtering each window
+	time = np.arange(0, 1, 1/2000)
+	signal = np.random.normal(0, 1, (time.size, 3)) + np.sin(2 * np.pi * 100 * time + 1)[:, None]
+	references = [refValue(time, 100, 0), refValue_phaseShift(time, 100, 0)]
+	indices = split(time.size, 5, 0.4)
+	mags, phases = prefix_sum_windows(signal, references, indices)
+	for k, index in enumerate(indices):
+		mixed, mixed_phaseShift, _ = mix(signal[index[0] : index[1]], time[index[0] : index[1]],
+		 100, 0, interpolate = False, pbar = False, window = 'rectangular')
+		expected_mags, expected_phases = apply_lowpass(mixed, mixed_phaseShift, time[index[0] : index[1]], 0, False)
+		nptest.assert_allclose(mags[k], expected_mags)
+		nptest.assert_allclose(phases[k], expected_phases)
+
+
+def test_apply_lowpass_complex():
+	#Testing that the complex lowpass matches filtering the real and imaginary parts separately
+	time = np.arange(0, 1, 1/1001)
+	signal = np.random.normal(0, 1, (time.size, 5)) + np.sin(2 * np.pi * 100 * time)[:, None]
+	mixed, mixed_phaseShift, _ = mix(signal, time, 100, 0.2, False, False)
+	mixed_complex, _ = mix_complex(signal, time, 100, 0.2, False, False)
+	nptest.assert_allclose(mixed_complex, mixed + 1j * mixed_phaseShift, atol = 10**(-12))
+	for cutoff in [0, 3, 20]:
+		r, theta = apply_lowpass_complex(mixed_complex, time, cutoff, False, channel_block = 2)
+		expected_r, expected_theta = [], []
+		sample_rate = time.size/(time[-1] - time[0])
+		for i in range(5):
+			filtered = fft_lowpass(mixed[:, i], cutoff, sample_rate, time.size)
+			filtered_phaseShift = fft_lowpass(mixed_phaseShift[:, i], cutoff, sample_rate, time.size)
+			expected_r.append(np.mean(np.hypot(filtered, filtered_phaseShift)))
+			expected_theta.append(np.mean(np.arctan2(filtered_phaseShift, filtered)))
+		nptest.assert_allclose(r, expected_r, atol = 10**(-12))
+		nptest.assert_allclose(theta, expected_theta, atol = 10**(-12))
+
+
+def test_fft_lowpass_odd_length():
+	#The inverse transform keeps the length of odd-length records, so passing
+	#every frequency gives back the signal times the lowpass gain of 2
+	data = np.random.default_rng(0).normal(0, 1, 1001)
+	filtered = fft_lowpass(data, 500, 1000, 1001)
+	assert len(filtered) == 1001
+	nptest.assert_allclose(filtered, 2 * data, atol = 1e-12)
+	#Pins the output for an odd-length interpolated record. It changed by about
+	#5e-4 from the baseline, which dropped a sample when transforming back.
+	rng = np.random.default_rng(3)
+	time = np.sort(np.arange(1001)/1000 + rng.normal(0, 1e-5, 1001))
+	signal = {'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time + 0.5)[:, None] * [1, 2]\
+	 + rng.normal(0, 0.5, (1001, 2))}
+	references = [{'time' : np.arange(1001)/1000, 'signal' : np.sin(2 * np.pi * 100 * np.arange(1001)/1000)}]
+	out = Amplifier(10, pbar = False).amplify(references, signal, interpolate = True)
+	nptest.assert_allclose(out['reference 1']['magnitudes'], [0.9757515496702025, 1.939257266200395], rtol = 1e-9)
+	nptest.assert_allclose(out['reference 1']['phases'], [0.42123839279009856, 0.4587012730906518], rtol = 1e-9)
+
+
+def test_screen_snr_aliasing():
+	#Testing that noise at an alias of the frequency isn't folded into the screen
+	time = np.arange(10**5)/10**4
+	decimated_rate = 10**4/(10**5//4096)
+	signal = np.random.default_rng(0).normal(0, 1, (time.size, 2))
+	signal[:, 0] += 5 * np.sin(2 * np.pi * (100 + decimated_rate) * time)
+	signal[:, 1] += 0.2 * np.sin(2 * np.pi * 100 * time)
+	snr = screen_snr(signal, time, [100])
+	assert snr[0, 0] < 5 and snr[0, 1] > 10
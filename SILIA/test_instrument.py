@@ -0,0 +1,44 @@
+import pytest
+import json
+import numpy as np
+import numpy.testing as nptest
+from .main import Amplifier
+from .instrument import *
+from .test_main import make_input
+
+
+def test_stage():
+	#Testing that stages are only recorded inside a recorder
+	with stage('outside'):
+		pass
+	with Recorder() as recorder:
+		with stage('outer', data = np.zeros((4, 2))):
+			with stage('inner'):
+				np.ones(10**5)
+	assert [record['stage'] for record in recorder.records] == ['inner', 'outer']
+	inner, outer = recorder.records
+	assert outer['shapes'] == {'data' : [4, 2]}
+	assert outer['wall time'] >= inner['wall time']
+	#The inner allocation counts towards the outer stage too
+	assert outer['allocated bytes'] >= inner['allocated bytes'] >= 8 * 10**5
+	assert current_recorder() is None
+
+
+def test_amplify_instrumented(tmp_path):
+	#Testing that instrumentation is returned and exported without changing results
+	references, signal = make_input()
+	expected = Amplifier(1, pbar = False).amplify(references, signal, num_windows = 4, window_size = 0.5)
+	amplifier = Amplifier(1, pbar = False, instrument = True)
+	out = amplifier.amplify(references, signal, num_windows = 4, window_size = 0.5)
+	nptest.assert_allclose(out['reference 1']['magnitudes'], expected['reference 1']['magnitudes'])
+	stages = set(record['stage'] for record in out['instrumentation'])
+	assert {'fit', 'mix', 'window', 'fft', 'mask', 'inverse fft', 'reduce', 'convert'} <= stages
+	#Windows processed on executor threads are recorded too
+	assert sum(record['stage'] == 'mix' for record in out['instrumentation']) == 5
+
+	amplifier.instrumentation.to_jsonl(str(tmp_path/'stages.jsonl'))
+	with open(str(tmp_path/'stages.jsonl')) as f:
+		assert len(f.readlines()) == len(out['instrumentation'])
+	amplifier.instrumentation.to_chrome_trace(str(tmp_path/'trace.json'))
+	with open(str(tmp_path/'trace.json')) as f:
+		assert len(json.load(f)['traceEvents']) == len(out['instrumentation'])
@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+import numpy.testing as nptest
+from .kernels import *
+from .helper import demodulate, fused_demodulate
+from .main import Amplifier
+
+
+def test_fused_sums():
+	#Testing the fused loop (as plain Python) against mixing and filtering with NumPy
+	rng = np.random.default_rng(0)
+	time = np.arange(300)/1000
+	signal = np.sin(2 * np.pi * 50 * time + 0.3).reshape((-1, 1)) * [1, 2, 3, 4, 5] + rng.normal(0, 1, (300, 5))
+	amp = Amplifier(0, pbar = False, channel_block = 2)
+	mags, phases = fused_demodulate(amp, fused_sums, signal, time, 50.2, 0.1)
+	expected_mags, expected_phases = demodulate(amp, signal, time, 50.2, 0.1, False)
+	nptest.assert_allclose(mags, expected_mags, rtol = 1e-10)
+	nptest.assert_allclose(phases, expected_phases, rtol = 1e-10)
+
+
+def test_engines():
+	assert get_kernel('numpy') is None
+	assert get_kernel('auto') is compiled_fused_sums
+	with pytest.raises(ValueError):
+		Amplifier(0, engine = 'fortran')
+	if numba is None:
+		with pytest.raises(ImportError):
+			Amplifier(0, engine = 'numba')
+
+
+def test_numba_engine():
+	#Testing the compiled kernel against the NumPy engine through amplify
+	pytest.importorskip('numba')
+	time = np.arange(2000)/1000
+	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time)}]
+	signal = {'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time).reshape((-1, 1, 1))
+	 * np.ones((1, 4, 4)) + np.random.default_rng(1).normal(0, 1, (2000, 4, 4))}
+	expected = Amplifier(0, pbar = False).amplify(references, signal)
+	out = Amplifier(0, pbar = False, engine = 'numba').amplify(references, signal)
+	nptest.assert_allclose(out['reference 1']['magnitudes'], expected['reference 1']['magnitudes'], rtol = 1e-10)
+	nptest.assert_allclose(out['reference 1']['phases'], expected['reference 1']['phases'], rtol = 1e-10)
+
+
+def test_kernel_then_processes(tmp_path):
+	#Testing that process pools still work and the interpreter exits after the
+	#kernel has run, in a separate process since a hang can't be recovered from
+	import os
+	import subprocess
+	import sys
+	script = '\n'.join([
+	 "import numpy as np",
+	 "from SILIA.kernels import get_kernel, fused_sums",
+	 "from SILIA.main import Amplifier",
+	 "import sys",
+	 "from SILIA import montecarlo",
+	 "from SILIA.test_montecarlo import error_trial",
+	 "if __name__ == '__main__':",
+	 "	kernel = get_kernel('auto') or fused_sums",
+	 "	kernel(np.ones((100, 4)), np.arange(100)/100, 5., 0., np.ones(100), 2)",
+	 "	time = np.arange(1000)/1000",
+	 "	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 50 * time)}]",
+	 "	signal = {'time' : time, 'signal' : np.ones((1000, 4))}",
+	 "	Amplifier(0, pbar = False, workers = 2, engine = 'auto').amplify(references, signal, num_windows = 2)",
+	 "	points = montecarlo.grid(snr = [1], samples = [1000])",
+	 "	montecarlo.run(error_trial, points, 2, sys.argv[1], workers = 2)",
+	])
+	root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	env = dict(os.environ, PYTHONPATH = root + os.pathsep + os.environ.get('PYTHONPATH', ''))
+	result = subprocess.run([sys.executable, '-c', script, str(tmp_path/'results.csv')], env = env, timeout = 120, capture_output = True)
+	assert result.returncode == 0, result.stderr.decode()
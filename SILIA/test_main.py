@@ -0,0 +1,129 @@
+import pytest
+import numpy as np
+import numpy.testing as nptest
+from .main import *
+
+
+def make_input(num_channels = 4):
+	#Noisy 100Hz signal in each channel and its reference
+	time = np.arange(0, 1, 1/2000)
+	signal = {'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time + 0.5)[:, None]\
+	 + np.random.normal(0, 1, (time.size, num_channels))}
+	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time)}]
+	return references, signal
+
+
+def test_amplify_cutoffs():
+	#Testing that a cutoff sweep matches separate runs for each cutoff
+	references, signal = make_input()
+	cutoffs = [0, 2, 10]
+	for fit_ref in [True, False]:
+		swept = Amplifier(0, pbar = False).amplify_cutoffs(references, signal, cutoffs, fit_ref = fit_ref)
+		for cutoff, out in zip(cutoffs, swept):
+			expected = Amplifier(cutoff, pbar = False).amplify(references, signal, fit_ref = fit_ref)
+			for key in out['reference 1']:
+				nptest.assert_allclose(out['reference 1'][key], expected['reference 1'][key], atol = 10**(-12))
+	#With a prefilter, the spectra are decimated for the highest cutoff, so the others
+	#only differ from separate runs by the decimation filter
+	cutoffs = [0, 5, 200]
+	for prefilter in ['cic', 'polyphase']:
+		amplifier = Amplifier(0, pbar = False, prefilter = prefilter)
+		swept = amplifier.amplify_cutoffs(references, signal, cutoffs)
+		for cutoff, out in zip(cutoffs, swept):
+			expected = Amplifier(cutoff, pbar = False, prefilter = prefilter).amplify(references, signal)
+			nptest.assert_allclose(out['reference 1']['magnitudes'], expected['reference 1']['magnitudes'],
+			 rtol = 10**(-12) if cutoff == 200 else 10**(-3))
+		with pytest.raises(ValueError):
+			amplifier.reevaluate(10**4)
+	#Retained spectra aren't sent to worker processes
+	import pickle
+	assert amplifier.spectra is not None
+	assert pickle.loads(pickle.dumps(amplifier)).spectra is None
+
+
+def test_mask():
+	#Testing that masked channels match the unmasked lock-in and are filled elsewhere
+	time = np.arange(0, 1, 1/2000)
+	signal = {'time' : time, 'signal' : np.random.normal(0, 1, (time.size, 4, 5))\
+	 + np.sin(2 * np.pi * 100 * time)[:, None, None]}
+	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time)}]
+	mask = np.zeros((4, 5), dtype = bool)
+	mask[1:3, 2:4] = True
+	amplifier = Amplifier(0, pbar = False, retain_spectra = True)
+	expected = Amplifier(0, pbar = False).amplify(references, signal, num_windows = 3, window_size = 0.5)
+	out = amplifier.amplify(references, signal, num_windows = 3, window_size = 0.5, mask = mask)
+	for key in ['magnitudes', 'phases', 'magnitude stds', 'phase stds']:
+		values = np.asarray(out['reference 1'][key])
+		assert values.shape == (4, 5)
+		assert np.all(np.isnan(values[~mask]))
+		nptest.assert_allclose(values[mask], np.asarray(expected['reference 1'][key])[mask], atol = 10**(-12))
+	reevaluated = np.asarray(amplifier.reevaluate()['reference 1']['magnitudes'])
+	nptest.assert_allclose(reevaluated[mask], np.asarray(expected['reference 1']['magnitudes'])[mask])
+	out = amplifier.amplify(references, signal, fit_ref = False, mask = mask, fill_value = 0)
+	assert np.all(np.asarray(out['reference 1']['magnitudes'])[~mask] == 0)
+	with pytest.raises(ValueError):
+		amplifier.amplify(references, signal, mask = mask[:3])
+
+
+def test_screen(monkeypatch):
+	#Testing that screening skips noise channels and keeps the lock-in of the others
+	time = np.arange(0, 1, 1/2000)
+	signal = {'time' : time, 'signal' : np.random.normal(0, 1, (time.size, 10, 10))}
+	signal['signal'][:, :2, :3] += np.sin(2 * np.pi * 100 * time)[:, None, None]
+	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time)}]
+	for fit_ref in [True, False]:
+		expected = Amplifier(0, pbar = False).amplify(references, signal, fit_ref = fit_ref)
+		out = Amplifier(0, pbar = False).amplify(references, signal, fit_ref = fit_ref, screen = 10)
+		assert out['screening']['channels'] == 100
+		assert out['screening']['skipped'] == 94
+		magnitudes = np.asarray(out['reference 1']['magnitudes'])
+		assert np.all(np.isnan(magnitudes[2:])) and np.all(np.isnan(magnitudes[:, 3:]))
+		nptest.assert_allclose(magnitudes[:2, :3], np.asarray(expected['reference 1']['magnitudes'])[:2, :3])
+	#The references are only fitted once
+	calls = []
+	def counted_fit(references):
+		calls.append(references)
+		return fit(references)
+	monkeypatch.setattr('SILIA.main.fit', counted_fit)
+	Amplifier(0, pbar = False).amplify(references, signal, screen = 10)
+	assert len(calls) == 1
+
+
+def test_amplify_batch():
+	#Testing that a batch of inputs with mixed shapes and timestamps matches separate runs
+	time = np.arange(0, 1, 1/2000)
+	other_time = np.arange(0, 0.8, 1/2000)
+	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time)},
+	 {'time' : time, 'signal' : np.sin(2 * np.pi * 130 * time)}]
+	inputs = [{'time' : time, 'signal' : np.random.normal(0, 1, (time.size, 3, 2))},
+	 {'time' : other_time, 'signal' : np.random.normal(0, 1, (other_time.size, 4))},
+	 {'time' : time, 'signal' : np.random.normal(0, 1, (time.size, 5))}]
+	amplifier = Amplifier(0, pbar = False)
+	for fit_ref in [True, False]:
+		outs = amplifier.amplify_batch(inputs, references, fit_ref = fit_ref, num_windows = 2, window_size = 0.5)
+		for signal_input, out in zip(inputs, outs):
+			expected = amplifier.amplify(references, signal_input, fit_ref = fit_ref,
+			 num_windows = 2, window_size = 0.5)
+			assert out.keys() == expected.keys()
+			for label in ['reference 1', 'reference 2']:
+				for key in expected[label]:
+					nptest.assert_allclose(out[label][key], expected[label][key], atol = 10**(-12))
+
+
+def test_flattop_window():
+	#Testing that flattop matches hanning at cutoff 0 and is refused with a nonzero cutoff,
+	#where its negative lobes would bias the magnitudes and phases
+	time = np.arange(0, 1, 1/2000)
+	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time)}]
+	signal = {'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time + 0.5).reshape((-1, 1))}
+	hanning = Amplifier(0, pbar = False).amplify(references, signal)
+	flattop = Amplifier(0, pbar = False, window = 'flattop').amplify(references, signal)
+	nptest.assert_allclose(flattop['reference 1']['magnitudes'], hanning['reference 1']['magnitudes'], rtol = 1e-3)
+	nptest.assert_allclose(flattop['reference 1']['phases'], hanning['reference 1']['phases'], atol = 1e-3)
+	hanning = Amplifier(10, pbar = False).amplify(references, signal)
+	assert hanning['reference 1']['magnitudes'][0] == pytest.approx(1, abs = 0.01)
+	with pytest.raises(ValueError):
+		Amplifier(10, pbar = False, window = 'flattop').amplify(references, signal)
+	amplifier = Amplifier(0, pbar = False, window = 'flattop')
+	with pytest.raises(ValueError):
+		amplifier.amplify_cutoffs(references, signal, [0, 10])
@@ -0,0 +1,49 @@
+import pytest
+import csv
+import json
+import numpy as np
+import numpy.testing as nptest
+from .montecarlo import *
+from .main import Amplifier
+from . import synth
+
+
+def error_trial(params, rng):
+	#Squared magnitude error of a lock-in on 10 noisy channels
+	references, signal = synth.generate(params['samples'], 1000, (10,), [synth.component(100)],
+	 snr = params['snr'], rng = rng)
+	out = Amplifier(0, pbar = False).amplify(references, signal)
+	return {'magnitude error squared' : (1 - np.asarray(out['reference 1']['magnitudes']))**2}
+
+
+def test_run(tmp_path):
+	#Testing that parallel and resumed sweeps give the same results as a serial one
+	points = grid(snr = [1, 0.1], samples = [1000])
+	path = str(tmp_path/'results.csv')
+	serial = run(error_trial, points, 3, path, seed = 4)
+	assert len(serial) == 2
+	assert serial[0]['count'] == 30
+	assert serial[0]['mean'] < serial[1]['mean']
+	with open(path) as f:
+		assert len(list(csv.DictReader(f))) == 2
+
+	parallel = run(error_trial, points, 3, str(tmp_path/'parallel.csv'), seed = 4, workers = 2)
+	assert parallel == serial
+
+	#Simulates an interrupted sweep by truncating the log mid-line
+	with open(path + '.trials.jsonl') as f:
+		lines = f.readlines()
+	with open(path + '.trials.jsonl', 'w') as f:
+		f.writelines(lines[:3] + [lines[3][:10]])
+	calls = []
+	def counted(params, rng):
+		calls.append(params)
+		return error_trial(params, rng)
+	assert run(counted, points, 3, path, seed = 4) == serial
+	assert len(calls) == 4
+	#A second resume finds every trial of the first one in the log
+	assert run(counted, points, 3, path, seed = 4) == serial
+	assert len(calls) == 4
+	assert len(load_log(path + '.trials.jsonl', json.loads(lines[0]))) == 6
+	with pytest.raises(ValueError):
+		run(error_trial, points, 3, path, seed = 5)
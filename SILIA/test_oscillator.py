@@ -0,0 +1,31 @@
+import numpy as np
+import numpy.testing as nptest
+from .oscillator import *
+
+
+def test_reference_values():
+	#Testing the recurrence against np.sin and np.cos over a long record
+	time = np.arange(10**6)/1e4
+	ref_vals, ref_vals_phaseShift = reference_values(time, 123.4, 0.5)
+	phase = 123.4 * time * 2 * np.pi + 0.5
+	#The tolerance is the rounding of the phase itself at the end of the record
+	nptest.assert_allclose(ref_vals, np.sin(phase), atol = 1e-10)
+	nptest.assert_allclose(ref_vals_phaseShift, np.cos(phase), atol = 1e-10)
+	#Long records at a high frequency still take the recurrence, the phase
+	#is only known to a few ulps there
+	assert is_even(np.arange(10**7)/1e5, 1e5)
+	#Unevenly spaced timestamps fall back to np.sin and np.cos
+	jittered = np.sort(time[:1000] + np.random.default_rng(0).normal(0, 1e-5, 1000))
+	assert not is_even(jittered, 123.4)
+	ref_vals, _ = reference_values(jittered, 123.4, 0.5)
+	nptest.assert_array_equal(ref_vals, np.sin(123.4 * jittered * 2 * np.pi + 0.5))
+
+
+def test_reference_blocks():
+	#Testing lazy blocks and float32 output
+	time = np.arange(1000)/1000
+	blocks = list(reference_blocks(time, 10, 0, block_size = 300, dtype = np.float32))
+	assert [start for start, _, _ in blocks] == [0, 300, 600, 900]
+	assert blocks[-1][1].dtype == np.float32 and len(blocks[-1][1]) == 100
+	ref_vals = np.concatenate([sin for _, sin, _ in blocks])
+	nptest.assert_allclose(ref_vals, np.sin(10 * time * 2 * np.pi), atol = 1e-6)
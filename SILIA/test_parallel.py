@@ -0,0 +1,93 @@
+import pytest
+import numpy as np
+import numpy.testing as nptest
+from .main import Amplifier
+from .parallel import *
+
+
+def test_shared_round_trip():
+	#Testing that arrays survive the trip through shared memory
+	array = np.arange(12.).reshape((3, 4))
+	shm, description = to_shared(array)
+	try:
+		attached, shared = from_shared(description)
+		nptest.assert_array_equal(shared, array)
+		attached.close()
+	finally:
+		shm.close()
+		shm.unlink()
+
+
+def test_parallel_matches_serial():
+	#Testing that splitting channels between processes doesn't change the output
+	time = np.arange(0, 1, 1/2000)
+	signal = {'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time + 0.5)[:, None]\
+	 + np.random.normal(0, 1, (time.size, 10))}
+	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time)}]
+	for fit_ref in [True, False]:
+		serial = Amplifier(0, pbar = False).amplify(references, signal, fit_ref = fit_ref)
+		parallel = Amplifier(0, pbar = False, workers = 2).amplify(references, signal, fit_ref = fit_ref)
+		for key in serial['reference 1']:
+			nptest.assert_allclose(parallel['reference 1'][key], serial['reference 1'][key])
+
+
+def test_window_executor():
+	#Testing that errorbars don't depend on how the windows are executed
+	time = np.arange(0, 1, 1/2000)
+	signal = {'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time + 0.5)[:, None]\
+	 + np.random.normal(0, 1, (time.size, 5))}
+	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time)}]
+	serial = Amplifier(0, pbar = False, window_workers = 1).amplify(references, signal,
+	 num_windows = 6, window_size = 0.3)
+	threaded = Amplifier(0, pbar = False, window_workers = 4).amplify(references, signal,
+	 num_windows = 6, window_size = 0.3)
+	for key in serial['reference 1']:
+		nptest.assert_array_equal(threaded['reference 1'][key], serial['reference 1'][key])
+
+
+def test_worker_pool_share():
+	#Testing that blocks of rows of a kept array use its shared copy
+	signal = np.arange(40.).reshape((10, 4))
+	with WorkerPool(2) as pool:
+		description, rows, shm = pool.share(signal, keep = True)
+		assert rows == (0, 10) and shm is None
+		window, window_rows, shm = pool.share(signal[3 : 7])
+		assert window == description and window_rows == (3, 7) and shm is None
+		_, _, shm = pool.share(signal[:, :2].copy())
+		assert shm is not None
+		release(shm)
+
+
+def test_workers_with_windows():
+	#Testing worker processes together with parallel errorbar windows
+	time = np.arange(0, 1, 1/2000)
+	signal = {'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time + 0.5)[:, None]\
+	 + np.random.normal(0, 1, (time.size, 6))}
+	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time)}]
+	for fit_ref in [True, False]:
+		serial = Amplifier(0, pbar = False).amplify(references, signal, fit_ref = fit_ref,
+		 num_windows = 3, window_size = 0.5)
+		parallel = Amplifier(0, pbar = False, workers = 2).amplify(references, signal, fit_ref = fit_ref,
+		 num_windows = 3, window_size = 0.5)
+		for key in serial['reference 1']:
+			nptest.assert_allclose(parallel['reference 1'][key], serial['reference 1'][key])
+
+
+def test_process_window_executor():
+	#Testing windows sent to worker processes, with and without instrumentation
+	import multiprocessing
+	from concurrent.futures import ProcessPoolExecutor
+	time = np.arange(0, 1, 1/2000)
+	signal = {'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time + 0.5)[:, None]\
+	 + np.random.normal(0, 1, (time.size, 4))}
+	references = [{'time' : time, 'signal' : np.sin(2 * np.pi * 100 * time)}]
+	threaded = Amplifier(0, pbar = False).amplify(references, signal, num_windows = 4, window_size = 0.4)
+	with ProcessPoolExecutor(max_workers = 2, mp_context = multiprocessing.get_context('spawn')) as executor:
+		for instrument in [False, True]:
+			for fit_ref in [True, False]:
+				expected = threaded if fit_ref else Amplifier(0, pbar = False).amplify(references, signal,
+				 fit_ref = False, num_windows = 4, window_size = 0.4)
+				out = Amplifier(0, pbar = False, window_executor = executor, instrument = instrument).amplify(
+				 references, signal, fit_ref = fit_ref, num_windows = 4, window_size = 0.4)
+				for key in expected['reference 1']:
+					nptest.assert_allclose(out['reference 1'][key], expected['reference 1'][key])
@@ -0,0 +1,67 @@
+import pytest
+import os
+import numpy as np
+import numpy.testing as nptest
+from .main import Amplifier
+from .planner import *
+from .kernels import fused_sums
+from .test_main import make_input
+
+
+def test_make_plan():
+	#Testing the planner's choices for some clear-cut cases
+	amplifier = Amplifier(0, pbar = False, lowpass = 'auto', channel_block = 'auto', window = 'rectangular')
+	plan = make_plan(amplifier, 1000, 4, 1, 8, True, False, calibration = DEFAULT_CALIBRATION)
+	assert plan['path'] == 'prefix sum'
+	assert plan['lowpass'] == 'fft'
+	assert plan['channel_block'] == 4
+	#A tight memory budget with a nonzero cutoff streams through the FIR filter
+	amplifier = Amplifier(10, pbar = False, lowpass = 'auto', channel_block = 'auto',
+	 memory_budget = 10**6)
+	with pytest.warns(UserWarning):
+		plan = make_plan(amplifier, 10**6, 64, 1, 8, True, False, calibration = DEFAULT_CALIBRATION)
+	assert plan['lowpass'] == 'fir'
+	assert plan['channel_block'] == 1
+	assert plan['predicted runtime'] > 0
+	#The input alone doesn't fit in the budget
+	assert not plan['within budget']
+
+
+def test_fused_plan(monkeypatch):
+	#Testing that the fused kernel is planned when it is available and faster
+	amplifier = Amplifier(0, pbar = False, engine = 'auto', workers = 'auto')
+	monkeypatch.setattr('SILIA.planner.get_kernel', lambda engine: fused_sums)
+	plan = make_plan(amplifier, 10**5, 64, 1, 8, True, False, calibration = DEFAULT_CALIBRATION)
+	assert plan['path'] == 'fused' and plan['engine'] == 'numba' and plan['workers'] is None
+	assert plan['within budget']
+	slow = dict(DEFAULT_CALIBRATION, fused = 1)
+	plan = make_plan(amplifier, 10**5, 64, 1, 8, True, False, calibration = slow)
+	assert plan['path'] == 'mix and fft lowpass' and plan['engine'] == 'numpy'
+	monkeypatch.setattr('SILIA.planner.get_kernel', lambda engine: None)
+	plan = make_plan(amplifier, 10**5, 64, 1, 8, True, False, calibration = DEFAULT_CALIBRATION)
+	assert plan['path'] == 'mix and fft lowpass'
+
+
+def test_auto_amplify():
+	#Testing that planned settings give the same results as explicit ones
+	references, signal = make_input()
+	auto = Amplifier(0, pbar = False, lowpass = 'auto', channel_block = 'auto',
+	 block_size = 'auto', workers = 'auto')
+	plan = auto.explain(signal, references)
+	out = auto.amplify(references, signal)
+	expected = auto.planned(plan).amplify(references, signal)
+	nptest.assert_allclose(out['reference 1']['magnitudes'], expected['reference 1']['magnitudes'])
+
+
+def test_calibrate(tmp_path):
+	#Testing that calibration constants are stored and loaded
+	path = str(tmp_path/'calibration.json')
+	calibration = calibrate(path, num_samples = 2**10, num_channels = 2)
+	assert os.path.exists(path)
+	assert load_calibration(path) == calibration
+	#Loaded constants are kept, not read from the file again
+	with open(path, 'w') as f:
+		f.write('{}')
+	assert load_calibration(path) == calibration
+	load_calibration(path)['fit'] = 0
+	assert load_calibration(path) == calibration
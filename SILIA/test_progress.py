@@ -0,0 +1,50 @@
+import pytest
+import logging
+import numpy as np
+import numpy.testing as nptest
+from .main import Amplifier
+from .progress import *
+from .test_main import make_input
+
+
+class RecordingObserver(Observer):
+	def __init__(self):
+		self.events = []
+
+	def started(self, stage, total = None):
+		self.events.append(('started', stage, total))
+
+	def progress(self, stage, done, total):
+		self.events.append(('progress', stage, done, total))
+
+	def finished(self, stage):
+		self.events.append(('finished', stage))
+
+
+def test_observer(capsys):
+	#Testing the events of a lock-in with errorbar windows, and that nothing is printed
+	references, signal = make_input(num_channels = 5)
+	observer = RecordingObserver()
+	amplifier = Amplifier(0, pbar = observer, channel_block = 2, window_workers = 1)
+	amplifier.amplify(references, signal, num_windows = 3, window_size = 0.5)
+	assert capsys.readouterr().out == ''
+	windows = [event for event in observer.events if event[1] == 'windows']
+	assert windows[0] == ('started', 'windows', 3)
+	assert windows[-2:] == [('progress', 'windows', 3, 3), ('finished', 'windows')]
+	lowpass = [event for event in observer.events if event[1] == 'lowpass']
+	assert lowpass[:4] == [('started', 'lowpass', 5), ('progress', 'lowpass', 2, 5),
+	 ('progress', 'lowpass', 4, 5), ('progress', 'lowpass', 5, 5)]
+	assert observer.events.count(('finished', 'mix')) == 4
+
+	Amplifier(0, pbar = False).amplify(references, signal, num_windows = 3, window_size = 0.5)
+	assert capsys.readouterr().out == ''
+
+
+def test_logging_observer(caplog):
+	#Testing that stages are logged with their throughput
+	references, signal = make_input()
+	with caplog.at_level(logging.INFO, logger = 'SILIA'):
+		Amplifier(0, pbar = LoggingObserver()).amplify(references, signal)
+	messages = [record.getMessage() for record in caplog.records]
+	assert 'mix started' in messages
+	assert any(message.startswith('lowpass finished in') and 'units/s' in message for message in messages)
@@ -0,0 +1,42 @@
+import pytest
+import numpy as np
+import numpy.testing as nptest
+from .synth import *
+from .main import Amplifier
+
+
+def test_signal():
+	#Testing reproducibility, chunking, masks and writing into a memmap
+	time = timestamps(1000, 1000)
+	mask = disk_mask((8, 8), (3, 3), 2)
+	components = [component(100, mask = mask), component(150, amplitude = 2, phase = 1)]
+	full = signal(time, (8, 8), components, rng = 1)
+	chunked = signal(time, (8, 8), components, rng = 1, chunk_size = 77)
+	nptest.assert_array_equal(full, chunked)
+	clean = signal(time, (8, 8), components, noise = 0)
+	expected = 2 * np.sin(2 * np.pi * 150 * time + 1)
+	nptest.assert_allclose(clean[:, 0, 0], expected, atol = 1e-12)
+	nptest.assert_allclose(clean[:, 3, 3], expected + np.sin(2 * np.pi * 100 * time), atol = 1e-12)
+	assert np.std(full - clean) == pytest.approx(1, rel = 0.05)
+
+
+def test_memmap(tmp_path):
+	#Testing generation into a memmap and a lock-in on it
+	path = str(tmp_path/'signal.npy')
+	out = open_memmap(path, (2000, 3))
+	references, signal_input = generate(2000, 1000, (3,), [component(100)], snr = 50,
+	 jitter = 1e-5, rng = 2, out = out, chunk_size = 512)
+	assert signal_input['signal'] is out
+	out.flush()
+	nptest.assert_array_equal(np.load(path), out)
+	result = Amplifier(0, pbar = False).amplify(references, signal_input, interpolate = True)
+	nptest.assert_allclose(result['reference 1']['magnitudes'], 1, atol = 0.05)
+
+
+def test_rngs():
+	#Testing that spawned streams are reproducible and independent
+	first, second = rngs(5, 2)
+	again = rngs(5, 3)
+	nptest.assert_array_equal(first.random(10), again[0].random(10))
+	nptest.assert_array_equal(second.random(10), again[1].random(10))
+	assert not np.array_equal(rngs(5, 2)[0].random(10), rngs(5, 2)[1].random(10))
@@ -2,6 +2,7 @@
 #numpy, scipy, Pillow, matplotlib, tqdm, timeit, and colorednoise.
 
 import SILIA
+import SILIA.synth
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
@@ -44,20 +45,9 @@ contain only Gaussian noise with a std of 1. Channels 20-40 contains a sin wave
 80Hz with an amplitude of 1 as well as the Gaussian noise and channels 60-80 contains a sin wave
 oscillating at 120Hz with the same amplitude and noise.
 '''
-signal = {'time' : time}
-sig_vals = []
-for t in time:
-    row = []
-    for channel in channels:
-        if (channel >= 0 and channel < 20) or (channel >= 40 and channel < 60) or (channel >= 80 and channel < 100):
-            row.append(np.random.normal(0, 1))
-        elif channel >= 20 and channel < 40:
-            row.append(np.sin(2 * np.pi * frequencies[0] * t) + np.random.normal(0, 1))
-        elif channel >= 60 and channel < 80:
-            row.append(np.sin(2 * np.pi * frequencies[1] * t) + np.random.normal(0, 1))
-    sig_vals.append(row)
-
-signal['signal'] = sig_vals
+in_band = [(channels >= 20) & (channels < 40), (channels >= 60) & (channels < 80)]
+components = [SILIA.synth.component(freq, mask = mask) for freq, mask in zip(frequencies, in_band)]
+signal = {'time' : time, 'signal' : SILIA.synth.signal(time, channels.shape, components)}
 
 '''
 Performing Lock-in Amplification
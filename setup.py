@@ -10,7 +10,7 @@ setuptools.setup(
     author_email="amrut.nadgir@gmail.com",
     description="A software implementation of a multi-channel and multi-frequency lock-in amplifier to extract periodic features from data.",
     url="https://github.com/amrutn/SILIA",
-    packages=['SILIA',],
+    packages=['SILIA', 'SILIA.benchmarks'],
     license='LICENSE.txt',
     long_description=long_description,
     install_requires=[